@@ -0,0 +1,98 @@
+"""
+Benchmark: decoding whole files vs repoScanner.find_in_file (mmap + byte-level find) for substring search.
+
+Builds a synthetic tree (10k .tfvars files by default, ~5% containing the needle, a few non-ASCII and
+one invalid UTF-8 file), runs both approaches the way replaceTagsInTerraform (strict UTF-8) and
+tag_plan_check (errors="ignore") use them, checks that they find exactly the same files and prints timings.
+
+python3 benchmarkSearch.py --files 10000 --size-kb 16
+"""
+
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+from repoScanner import find_in_file, iter_files
+from tag_plan_check import rule_by_name
+
+NEEDLE = "dcprod777a"
+FILLER = '  "{name}-u0{n}" = {{\n    size_in_gbs = {size}\n    vpus_per_gb = 10\n  }}\n'
+
+
+def build_tree(root, files, size_kb, match_ratio, seed=7):
+    rng = random.Random(seed)
+    pool = [FILLER.format(name=f"dcprod{rng.randrange(700):03d}a", n=rng.randrange(10), size=rng.randrange(50, 999))
+            for _ in range(1000)]
+    per_file = size_kb * 1024 // len(pool[0]) + 1
+    for i in range(files):
+        directory = os.path.join(root, f"stack{i // 100:03d}")
+        os.makedirs(directory, exist_ok=True)
+        blocks = rng.choices(pool, k=per_file)
+        if rng.random() < match_ratio:
+            blocks.insert(rng.randrange(len(blocks)), FILLER.format(name=NEEDLE, n=1, size=100))
+            blocks.append("  # ~ size_in_gbs changed\n")
+        if i % 1000 == 1:
+            blocks.insert(0, "# owner: José Müller\n")
+        data = "".join(blocks).encode("utf-8")
+        if i == 3:
+            data = b"# broken \xff byte\n" + data
+        with open(os.path.join(directory, f"s{i}.tfvars"), "wb") as f:
+            f.write(data)
+
+
+def decoded_search(path, needles, errors):
+    try:
+        with open(path, "r", encoding="utf-8", errors=errors) as f:
+            text = f.read()
+    except UnicodeDecodeError:
+        return None
+    return {needle for needle in needles if needle in text}
+
+
+def mmap_search(path, needles, errors):
+    try:
+        return find_in_file(path, needles, errors=errors)
+    except UnicodeDecodeError:
+        return None
+
+
+def run(label, search, paths, needles, errors, repeat):
+    best, results = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [search(path, needles, errors) for path in paths]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    matched = sum(1 for found in results if found)
+    print(f"{label:<38} {best:8.3f}s  {len(paths) / best:10.0f} files/s  {matched:6d} matched")
+    return results, best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare decoded vs mmap substring search on a synthetic tree")
+    parser.add_argument("--files", "-n", type=int, default=10000, help="Number of files to generate")
+    parser.add_argument("--size-kb", "-s", type=int, default=16, help="Approximate size of each file in KB")
+    parser.add_argument("--match-ratio", "-m", type=float, default=0.05, help="Share of files containing the needle")
+    parser.add_argument("--repeat", "-r", type=int, default=3, help="Runs per approach; the best is reported")
+    parser.add_argument("--dir", "-d", help="Build the tree here instead of a temporary directory (kept afterwards)")
+    args = parser.parse_args()
+
+    root = args.dir or tempfile.mkdtemp(prefix="bench-search-")
+    try:
+        start = time.perf_counter()
+        build_tree(root, args.files, args.size_kb, args.match_ratio)
+        paths = list(iter_files(root, ["*.tfvars"]))
+        print(f"Built {len(paths)} files of ~{args.size_kb} KB in {time.perf_counter() - start:.1f}s under {root}")
+
+        for errors, needles in (("strict", [NEEDLE]), ("ignore", list(rule_by_name("search_strings").patterns))):
+            decoded, decoded_time = run(f"decode + str.find ({errors})", decoded_search, paths, needles, errors, args.repeat)
+            mapped, mapped_time = run(f"find_in_file, bytes/mmap ({errors})", mmap_search, paths, needles, errors, args.repeat)
+            if decoded != mapped:
+                raise SystemExit(f"Results differ for errors={errors}")
+            print(f"{'identical results, speedup':<38} {decoded_time / mapped_time:8.2f}x")
+    finally:
+        if not args.dir:
+            shutil.rmtree(root)
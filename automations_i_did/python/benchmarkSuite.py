@@ -0,0 +1,310 @@
+"""
+Benchmark suite for replaceTagsInTerraform, findAndReplaceInTerraform and tag_plan_check.
+
+Generates a synthetic Terraform repo (N .tfvars files with M server blocks each, plus the tag and
+resize CSVs that drive the scripts) and a corpus of K plan files of a configurable size. Every script
+is then run through its command line in a fresh process and timed end to end; its phases are the
+instrumentation timers the script itself records (--metrics-json), so the numbers describe the code
+that ships. Peak RSS is the script's own. Results are written as JSON; pass an earlier result with
+--compare to see what a change did.
+
+python3 benchmarkSuite.py --files 2000 --servers 20 --plans 1000 --plan-kb 64 --output HEAD.json
+python3 benchmarkSuite.py --output new.json --compare HEAD.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+try:
+    import resource  # not available on Windows; peak RSS is then reported as null
+except ImportError:
+    resource = None
+
+from repoScanner import READ_WORKERS
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULT_FORMAT = 2  # 2: phases are the scripts' instrumentation timers
+BENCHMARKS = ("replaceTags", "findAndReplace", "tagPlanCheck")
+
+TAGS = ("owner", "product_line", "environment", "application", "product_name", "customer_name")
+SERVER_BLOCK = """  "{name}" = {{
+    shape = "VM.Standard.E4.Flex"
+    freeform_tags = {{
+{tags}    }}
+    block_volumes = {{
+      "{name}-u01" = {{
+        size_in_gbs = {u01}
+        vpus_per_gb = 10
+      }}
+      "{name}-u02" = {{
+        size_in_gbs = {u02}
+      }}
+    }}
+  }}
+"""
+
+PLAN_VOLUME = """  # module.db[{n}].oci_core_volume.block_volume will be updated in-place
+      ~ freeform_tags = {{
+          + "owner"         = "dba"
+          + "product_line"  = "db"
+          + "environment"   = "prod"
+          + "application"   = "oracle"
+        }}
+        id            = "ocid1.volume.oc1..{n:08d}"
+        display_name  = "u0{n}"
+        {ninth}
+    }}
+"""
+PLAN_POLICY = "  # module.db[{n}].oci_core_volume_backup_policy_assignment.volume_backup_policy_assignment[0] must be replaced\n"
+PLAN_INSTANCE = "  # module.db.oci_core_instance.instance will be updated in-place\n        # (6 unchanged blocks hidden)\n"
+PLAN_FILLER = "  # module.net[{n}].oci_core_vnic_attachment.vnic will be read during apply\n        id = (known after apply)\n"
+
+
+#generators
+def server_name(number):
+    # the tag CSV carries one extra character after the name the repo is searched for
+    return f"dc{number:06d}a"
+
+
+def build_repo(root, files, servers, csv_ratio, seed=11):
+    """Write files .tfvars files with servers server blocks each; return (tag CSV, resize CSV) paths."""
+    rng = random.Random(seed)
+    tag_rows, resize_rows = [], []
+    for i in range(files):
+        directory = os.path.join(root, "repo", f"stack{i // 100:03d}")
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, f"servers{i}.tfvars")
+        blocks = ["instances = {\n"]
+        for j in range(servers):
+            name = server_name(i * servers + j)
+            tags = "".join(f'      "{tag}" = "old-{tag}"\n' for tag in TAGS)
+            blocks.append(SERVER_BLOCK.format(name=name, tags=tags, u01=rng.randrange(50, 500), u02=rng.randrange(50, 500)))
+            if rng.random() < csv_ratio:
+                tag_rows.append([name + "x"] + [f"new-{tag}-{j}" for tag in TAGS])
+                resize_rows.append([file_path, f"{name}-u01", str(rng.randrange(500, 999))])
+        blocks.append("}\n")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.writelines(blocks)
+
+    csv_paths = (os.path.join(root, "tags.csv"), os.path.join(root, "resize.csv"))
+    for csv_path, rows in zip(csv_paths, (tag_rows, resize_rows)):
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.writelines(",".join(row) + "\n" for row in rows)
+    return csv_paths
+
+
+def plan_text(rng, plan_kb):
+    volumes = rng.choice((6, 18))
+    broken = rng.random() < 0.1  # about one plan in ten has something for the checks to report
+    parts = [PLAN_VOLUME.format(n=n, ninth="# (13 unchanged attributes hidden)") for n in range(volumes)]
+    if broken:
+        parts[rng.randrange(volumes)] = PLAN_VOLUME.format(n=0, ninth="~ size_in_gbs = 100 -> 200")
+    parts += [PLAN_POLICY.format(n=n) for n in range(volumes - broken)]
+    parts.append(PLAN_INSTANCE)
+    size, n = sum(map(len, parts)), 0
+    while size < plan_kb * 1024:
+        filler = PLAN_FILLER.format(n=n)
+        parts.append(filler)
+        size, n = size + len(filler), n + 1
+    totals = (6, 7, 6) if volumes == 6 else (18, 21, 18)
+    parts.append("Plan: {} to add, {} to change, {} to destroy.\n".format(*totals))
+    return "".join(parts)
+
+
+def build_plans(root, plans, plan_kb, seed=13):
+    rng = random.Random(seed)
+    folder = os.path.join(root, "plans")
+    os.makedirs(os.path.join(folder, "nested"), exist_ok=True)
+    for k in range(plans):
+        directory = folder if k % 10 else os.path.join(folder, "nested")
+        with open(os.path.join(directory, f"plan{k}.txt"), "w", encoding="utf-8") as f:
+            f.write(plan_text(rng, plan_kb))
+    return folder
+
+
+#measurements
+def peak_rss_mb(children=False):
+    """Peak RSS of this process, or with children of the largest child process waited for."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)  # bytes on macOS, KB elsewhere
+
+
+def run_script(workdir, script, *args):
+    """Run script's command line in workdir with --metrics-json.
+
+    Returns (end-to-end seconds, seconds per instrumentation timer, counters, peak RSS of the script).
+    The script's own output goes to a log file in workdir; it is not what is measured.
+    """
+    metrics_file, log_file = os.path.join(workdir, "metrics.json"), os.path.join(workdir, "script.log")
+    with open(log_file, "w", encoding="utf-8") as log:
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, script), *args, "--metrics-json", metrics_file],
+                                cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+        total = time.perf_counter() - start
+    if result.returncode:
+        with open(log_file, encoding="utf-8", errors="replace") as log:
+            raise RuntimeError(f"{script} exited with {result.returncode}:\n{log.read()[-2000:]}")
+    with open(metrics_file, encoding="utf-8") as f:
+        metrics = json.load(f)
+    phases = {timer["name"]: timer["seconds"] for timer in metrics["timers"]}
+    counters = {counter["name"] + ("{" + ",".join(f"{key}={value}" for key, value in counter["labels"].items()) + "}"
+                                   if counter["labels"] else ""): counter["value"]
+                for counter in metrics["counters"]}
+    return total, phases, counters, peak_rss_mb(children=True)
+
+
+#benchmarks - each returns run_script's results for a fresh copy of the data
+def bench_replace_tags(workdir, params):
+    return run_script(workdir, "replaceTagsInTerraform.py", "--file", "tags.csv", "--path", "repo", "--batch",
+                      "--workers", str(params["workers"]))
+
+
+def bench_find_and_replace(workdir, params):
+    return run_script(workdir, "findAndReplaceInTerraform.py", "--csv", "resize.csv")
+
+
+def bench_tag_plan_check(workdir, params):
+    return run_script(workdir, "tag_plan_check.py", "--path", "plans", "--workers", str(params["plan_workers"]))
+
+
+BENCHMARK_FUNCTIONS = {
+    "replaceTags": bench_replace_tags,
+    "findAndReplace": bench_find_and_replace,
+    "tagPlanCheck": bench_tag_plan_check,
+}
+
+
+def run_once(name, params):
+    """One run of one benchmark on its own copy of the generated data; called in a fresh process."""
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-", dir=params["scratch"])
+    try:
+        for item in ("repo", "plans"):
+            shutil.copytree(os.path.join(params["source"], item), os.path.join(workdir, item))
+        for item in ("tags.csv", "resize.csv"):
+            shutil.copy(os.path.join(params["source"], item), workdir)
+        # the resize CSV names files by absolute path, so point it at this copy
+        resize_csv = os.path.join(workdir, "resize.csv")
+        with open(resize_csv, encoding="utf-8") as f:
+            text = f.read().replace(params["source"], workdir)
+        with open(resize_csv, "w", encoding="utf-8") as f:
+            f.write(text)
+        return BENCHMARK_FUNCTIONS[name](workdir, params)
+    finally:
+        shutil.rmtree(workdir)
+
+
+def run_benchmark(name, params, repeat):
+    """Best of repeat runs; every run gets a new process so peak RSS is measured per run."""
+    runs = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            runs.append(executor.submit(run_once, name, params).result())
+    totals = [total for total, _, _, _ in runs]
+    phase_names = sorted(runs[0][1], key=runs[0][1].get, reverse=True)
+    rss = [run_rss for _, _, _, run_rss in runs if run_rss is not None]
+    return {
+        "seconds": round(min(totals), 4),
+        "runs": [round(total, 4) for total in totals],
+        "phases": {phase: round(min(run[1].get(phase, 0.0) for run in runs), 4) for phase in phase_names},
+        "peak_rss_mb": max(rss) if rss else None,
+        "counters": runs[0][2],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+#report
+def print_results(results, previous=None):
+    previous = (previous or {}).get("benchmarks", {})
+    header = f"{'benchmark':<16} {'phase':<28} {'seconds':>9}"
+    print(header + (f" {'before':>9} {'change':>8}" if previous else ""))
+    for name, result in results["benchmarks"].items():
+        before = previous.get(name, {})
+        rows = [("total", result["seconds"], before.get("seconds"))]
+        rows += [(phase, seconds, before.get("phases", {}).get(phase)) for phase, seconds in result["phases"].items()]
+        for phase, seconds, old in rows:
+            line = f"{name:<16} {phase:<28} {seconds:9.3f}"
+            if old:
+                line += f" {old:9.3f} {(seconds - old) / old:+8.1%}"
+            print(line)
+        rss, old_rss = result["peak_rss_mb"], before.get("peak_rss_mb")
+        if rss is not None:
+            print(f"{name:<16} {'rss MB':<28} {rss:9.1f}" + (f" {old_rss:9.1f} {(rss - old_rss) / old_rss:+8.1%}" if old_rss else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Terraform automation scripts on synthetic data")
+    parser.add_argument("--files", "-n", type=int, default=1000, help="Number of .tfvars files to generate")
+    parser.add_argument("--servers", "-m", type=int, default=20, help="Server blocks per .tfvars file")
+    parser.add_argument("--csv-ratio", type=float, default=0.5, help="Share of servers in the tag and resize CSVs")
+    parser.add_argument("--plans", "-k", type=int, default=500, help="Number of plan files to generate")
+    parser.add_argument("--plan-kb", type=int, default=32, help="Approximate size of each plan file in KB")
+    parser.add_argument("--workers", "-w", type=int, default=READ_WORKERS,
+                        help="Read threads for the tfvars scripts")
+    parser.add_argument("--plan-workers", type=int, default=1, help="Processes tag_plan_check checks plans with")
+    parser.add_argument("--repeat", "-r", type=int, default=3, help="Runs per benchmark; the best is reported")
+    parser.add_argument("--only", action="append", choices=BENCHMARKS, help="Run only this benchmark, repeatable")
+    parser.add_argument("--output", "-o", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", "-c", help="Earlier JSON results to compare against")
+    parser.add_argument("--dir", "-d", help="Generate the data here instead of a temporary directory (kept afterwards)")
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+
+    root = args.dir or tempfile.mkdtemp(prefix="bench-suite-")
+    source = os.path.join(root, "source")
+    try:
+        start = time.perf_counter()
+        if not os.path.isdir(source):
+            build_repo(source, args.files, args.servers, args.csv_ratio)
+            build_plans(source, args.plans, args.plan_kb)
+        print(f"Generated data under {source} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        params = {"source": os.path.abspath(source), "scratch": os.path.abspath(root), "workers": args.workers,
+                  "plan_workers": args.plan_workers}
+        results = {
+            "format": RESULT_FORMAT,
+            "commit": git_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": {"files": args.files, "servers": args.servers, "csv_ratio": args.csv_ratio,
+                           "plans": args.plans, "plan_kb": args.plan_kb, "workers": args.workers,
+                           "plan_workers": args.plan_workers},
+            "repeat": args.repeat,
+            "benchmarks": {},
+        }
+        for name in args.only or BENCHMARKS:
+            print(f"Running {name}...", file=sys.stderr)
+            results["benchmarks"][name] = run_benchmark(name, params, args.repeat)
+
+        if previous and previous.get("parameters") != results["parameters"]:
+            print("⚠️ Compared results were produced with different parameters", file=sys.stderr)
+        print_results(results, previous)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        if not args.dir:
+            shutil.rmtree(root)
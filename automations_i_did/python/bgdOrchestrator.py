@@ -0,0 +1,483 @@
+"""
+asyncio engine for the Aurora blue-green upgrade pipeline.
+
+Every cluster runs through its own state machine, independently of the others:
+discovered -> eligible -> creating -> provisioning -> available -> verified -> switching -> done
+Concurrency limits apply per region and per account, separately for creating BGDs and for
+switching over, so fast clusters never wait behind slow ones.
+Input File : Comma Separated of region,clustername (same as triggerAwsBlueGreenDeployment.py)
+"""
+
+import json
+import random
+import asyncio
+import argparse
+import logging
+from typing import Dict, List
+
+import instrumentation
+import triggerAwsBlueGreenDeployment as bgd
+
+logger = logging.getLogger(__name__)
+
+# Cluster states, in pipeline order, plus the two ways out
+DISCOVERED = "discovered"
+ELIGIBLE = "eligible"
+CREATING = "creating"
+PROVISIONING = "provisioning"
+AVAILABLE = "available"
+VERIFIED = "verified"
+SWITCHING = "switching"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+# states a resumed run picks up from
+RESUMABLE_STATES = (CREATING, PROVISIONING, AVAILABLE, VERIFIED, SWITCHING)
+
+# how long status requests of one region are collected before a single describe is sent
+STATUS_BATCH_WINDOW = 0.5
+# how long one wait for a BGD status (provisioning, switchover) may take before its cluster fails
+BGD_WAIT_TIMEOUT = 6 * 3600
+
+
+def account_of(db_cluster_arn):
+    """arn:aws:rds:<region>:<account>:cluster:<name> -> account id"""
+    parts = (db_cluster_arn or "").split(":")
+    return parts[4] if len(parts) > 4 else "unknown"
+
+
+#backends
+class Boto3RdsBackend:
+    """Real RDS: runs the blocking boto3 calls of triggerAwsBlueGreenDeployment in worker threads."""
+
+    async def describe_clusters(self, region_name, db_cluster_identifiers):
+        client = bgd.get_rds_client(region_name)
+        found = {}
+        for i in range(0, len(db_cluster_identifiers), bgd.DESCRIBE_FILTER_CHUNK):
+            chunk = db_cluster_identifiers[i:i + bgd.DESCRIBE_FILTER_CHUNK]
+            found.update(await asyncio.to_thread(bgd.request_scheduler.call, region_name, 'DescribeDBClusters',
+                                                 bgd.describe_clusters_in_region, client, region_name, chunk))
+        return found
+
+    async def create_bgd(self, region_name, config):
+        client = bgd.get_rds_client(region_name)
+        response = await asyncio.to_thread(bgd.request_scheduler.call, region_name, 'CreateBlueGreenDeployment',
+                                           client.create_blue_green_deployment, **config)
+        return response["BlueGreenDeployment"]
+
+    async def describe_bgds(self, region_name, bgd_deployment_ids):
+        return await asyncio.to_thread(bgd.request_scheduler.call, region_name, 'DescribeBlueGreenDeployments',
+                                       bgd.describe_bgds_in_region, bgd.get_rds_client(region_name), bgd_deployment_ids)
+
+    async def find_bgd(self, region_name, bgd_deployment_name):
+        found = await asyncio.to_thread(bgd.request_scheduler.call, region_name, 'DescribeBlueGreenDeployments',
+                                        bgd.describe_bgds_in_region, bgd.get_rds_client(region_name),
+                                        [bgd_deployment_name], 'blue-green-deployment-name')
+        return next(iter(found.values()), None)
+
+    async def get_engine_version(self, region_name, cluster_arn):
+        return await asyncio.to_thread(bgd.get_engine_version, bgd.get_rds_client(region_name), cluster_arn)
+
+    async def switchover(self, region_name, bgd_deployment_id):
+        return await asyncio.to_thread(bgd.switchover_bgd, bgd.get_rds_client(region_name), bgd_deployment_id)
+
+
+class FakeRdsBackend:
+    """In-memory RDS for running the orchestrator offline.
+
+    clusters maps (region_name, db_cluster_identifier) -> engine version. A BGD becomes AVAILABLE
+    provision_time seconds after it is created and SWITCHOVER_COMPLETED switchover_time seconds
+    after the switchover. Calls are counted per API in calls.
+    """
+
+    def __init__(self, clusters, provision_time=1.0, switchover_time=0.5, green_engine_version=None, account="123456789012"):
+        self.clusters = clusters
+        self.provision_time = provision_time
+        self.switchover_time = switchover_time
+        self.green_engine_version = green_engine_version
+        self.account = account
+        self.bgds = {}
+        self.calls = {}
+
+    def _call(self, api):
+        self.calls[api] = self.calls.get(api, 0) + 1
+        return asyncio.get_running_loop().time()
+
+    def _provision_time(self, region_name, db_cluster_identifier):
+        return self.provision_time(region_name, db_cluster_identifier) if callable(self.provision_time) else self.provision_time
+
+    async def describe_clusters(self, region_name, db_cluster_identifiers):
+        self._call("describe_db_clusters")
+        found = {}
+        for db_cluster_identifier in db_cluster_identifiers:
+            engine_version = self.clusters.get((region_name, db_cluster_identifier))
+            if engine_version:
+                found[db_cluster_identifier.lower()] = {
+                    'engine_version': engine_version,
+                    'db_cluster_arn': f"arn:aws:rds:{region_name}:{self.account}:cluster:{db_cluster_identifier}"
+                }
+        return found
+
+    async def create_bgd(self, region_name, config):
+        now = self._call("create_blue_green_deployment")
+        bgd_deployment_id = f"bgd-{len(self.bgds) + 1:06d}"
+        db_cluster_identifier = config["Source"].split(":")[-1]
+        self.bgds[bgd_deployment_id] = {
+            "name": config["BlueGreenDeploymentName"],
+            "region_name": region_name,
+            "available_at": now + self._provision_time(region_name, db_cluster_identifier),
+            "switched_at": None,
+            "target": f"arn:aws:rds:{region_name}:{self.account}:cluster:{db_cluster_identifier}-green",
+            "engine_version": self.green_engine_version or config["TargetEngineVersion"],
+        }
+        return {"BlueGreenDeploymentIdentifier": bgd_deployment_id, "Status": "PROVISIONING"}
+
+    def _status(self, entry, now):
+        if entry["switched_at"] is not None:
+            return "SWITCHOVER_COMPLETED" if now >= entry["switched_at"] + self.switchover_time else "SWITCHOVER_IN_PROGRESS"
+        return "AVAILABLE" if now >= entry["available_at"] else "PROVISIONING"
+
+    async def describe_bgds(self, region_name, bgd_deployment_ids):
+        now = self._call("describe_blue_green_deployments")
+        return {
+            bgd_deployment_id: {
+                "BlueGreenDeploymentIdentifier": bgd_deployment_id,
+                "Status": self._status(self.bgds[bgd_deployment_id], now),
+                "SwitchoverDetails": [{"TargetMember": self.bgds[bgd_deployment_id]["target"]}],
+            }
+            for bgd_deployment_id in bgd_deployment_ids if bgd_deployment_id in self.bgds
+        }
+
+    async def find_bgd(self, region_name, bgd_deployment_name):
+        now = self._call("describe_blue_green_deployments")
+        for bgd_deployment_id, entry in self.bgds.items():
+            if entry["name"] == bgd_deployment_name:
+                return {"BlueGreenDeploymentIdentifier": bgd_deployment_id, "Status": self._status(entry, now)}
+        return None
+
+    async def get_engine_version(self, region_name, cluster_arn):
+        self._call("describe_db_clusters")
+        return next((entry["engine_version"] for entry in self.bgds.values() if entry["target"] == cluster_arn), None)
+
+    async def switchover(self, region_name, bgd_deployment_id):
+        now = self._call("switchover_blue_green_deployment")
+        self.bgds[bgd_deployment_id]["switched_at"] = now
+        return True
+
+
+class _RegionStatusBatcher:
+    """Collects BGD status requests of one region for a short window and answers them with one describe."""
+
+    def __init__(self, backend, region_name, window):
+        self.backend = backend
+        self.region_name = region_name
+        self.window = window
+        self.pending = {}
+        self.flush_task = None
+
+    async def get(self, bgd_deployment_id):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(bgd_deployment_id, []).append(future)
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self):
+        await asyncio.sleep(self.window)
+        pending, self.pending, self.flush_task = self.pending, {}, None
+        try:
+            bgds = await self.backend.describe_bgds(self.region_name, list(pending))
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for bgd_deployment_id, futures in pending.items():
+            for future in futures:
+                # callers that were cancelled meanwhile have a done future already
+                if not future.done():
+                    future.set_result(bgds.get(bgd_deployment_id))
+
+
+class _Both:
+    """async context manager holding two semaphores at once."""
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    async def __aenter__(self):
+        await self.first.acquire()
+        try:
+            await self.second.acquire()
+        except BaseException:
+            self.first.release()
+            raise
+
+    async def __aexit__(self, *exc):
+        self.second.release()
+        self.first.release()
+
+
+def resume_state(record):
+    """The state a resumed record continues from; None when it starts over from discovery.
+
+    A record with a BGD but without a resumable state (failed, or journaled by
+    triggerAwsBlueGreenDeployment, which records no states) picks up from its BGD: the
+    switchover when one was triggered, otherwise the wait for it to become available.
+    """
+    state = record.get("state")
+    if state in RESUMABLE_STATES:
+        return state
+    if not record.get("bgd_deployment_id"):
+        return None
+    if record.get("switchover_triggered") or (record.get("bgd_deployment_status") or "").startswith("SWITCHOVER"):
+        return SWITCHING
+    return PROVISIONING
+
+
+#engine
+class BgdOrchestrator:
+    """Moves every cluster through its own blue-green state machine concurrently.
+
+    region_limit and account_limit cap how many clusters of one region / account may be creating
+    a BGD at the same time; switchover_region_limit and switchover_account_limit (the same by default)
+    cap the switchovers in flight. The two kinds have their own slots, so clusters waiting for a slow
+    switchover never hold up BGD creates in their region. on_transition(record) is called after every state
+    change; pass CheckpointJournal-style recording there to make runs resumable. run() returns
+    {db_cluster_identifier: record}, where a record carries the cluster details plus state,
+    bgd_deployment_id, bgd_deployment_status and error.
+    """
+
+    def __init__(self, backend, target_engine_version, min_touch_version, region_limit=5, account_limit=20,
+                 poll_intervals=None, status_batch_window=STATUS_BATCH_WINDOW, on_transition=None,
+                 switchover_region_limit=None, switchover_account_limit=None, wait_timeout=BGD_WAIT_TIMEOUT):
+        self.backend = backend
+        self.target_engine_version = target_engine_version
+        self.min_touch_version = min_touch_version
+        self.limits = {
+            "create": (region_limit, account_limit),
+            "switchover": (switchover_region_limit or region_limit, switchover_account_limit or account_limit),
+        }
+        self.poll_intervals = poll_intervals or bgd.POLL_INTERVALS
+        self.status_batch_window = status_batch_window
+        self.wait_timeout = wait_timeout
+        self.on_transition = on_transition
+        self.records = {}
+        self._region_slots = {}   # (kind, region) -> semaphore
+        self._account_slots = {}  # (kind, account) -> semaphore
+        self._batchers = {}
+
+    def _transition(self, record, state, **changes):
+        record.update(changes)
+        record["state"] = state
+        logger.info(f"📌 {record['db_cluster_identifier']} - {state}" + (f" ({record['error']})" if record.get("error") else ""))
+        if self.on_transition:
+            self.on_transition(record)
+
+    def _slots(self, record, kind):
+        """Acquire the region and account slots of record for kind ("create" or "switchover"), in that order."""
+        region_limit, account_limit = self.limits[kind]
+        region_slot = self._region_slots.setdefault((kind, record["region_name"]), asyncio.Semaphore(region_limit))
+        account_slot = self._account_slots.setdefault((kind, account_of(record.get("db_cluster_arn"))),
+                                                      asyncio.Semaphore(account_limit))
+        return _Both(region_slot, account_slot)
+
+    async def _bgd(self, record):
+        batcher = self._batchers.get(record["region_name"])
+        if batcher is None:
+            batcher = self._batchers[record["region_name"]] = _RegionStatusBatcher(self.backend, record["region_name"], self.status_batch_window)
+        return await batcher.get(record["bgd_deployment_id"])
+
+    async def _wait_for(self, record, statuses):
+        """Poll record's BGD with adaptive, jittered intervals until its status is in statuses or no longer active.
+
+        A describe that fails is retried with the same backoff, like monitor_and_switchover does;
+        TimeoutError is raised when the status hasn't got there within wait_timeout seconds.
+        """
+        status, previous, delay = record.get("bgd_deployment_status"), None, None
+        deadline = asyncio.get_running_loop().time() + self.wait_timeout
+        while True:
+            delay = self._next_delay(status, previous, delay)
+            await asyncio.sleep(delay * random.uniform(1 - bgd.POLL_JITTER, 1 + bgd.POLL_JITTER))
+            if asyncio.get_running_loop().time() > deadline:
+                raise TimeoutError(f"BGD still {status} after {self.wait_timeout}s")
+            try:
+                entry = await self._bgd(record)
+            except Exception as e:
+                logger.warning(f"⚠️ {record['db_cluster_identifier']} - Error fetching BGD status, polling again: {str(e)}")
+                instrumentation.count("bgd_status_errors", region=record["region_name"])
+                previous = status
+                continue
+            previous, status = status, entry["Status"] if entry else "ERROR"
+            record["bgd_deployment_status"] = status
+            if status in statuses or status not in bgd.ACTIVE_BGD_STATUSES:
+                return entry
+
+    def _next_delay(self, status, previous_status, previous_delay):
+        first, longest = self.poll_intervals.get(status, self.poll_intervals["PROVISIONING"])
+        if status != previous_status or previous_delay is None:
+            return first
+        return min(previous_delay * 2, longest)
+
+    async def _check_eligibility(self, record):
+        goodforbgd, _ = bgd.check_engine_versions_for_bgd(
+            {record["db_cluster_identifier"]: record}, self.min_touch_version, self.target_engine_version)
+        if goodforbgd:
+            self._transition(record, ELIGIBLE)
+        else:
+            self._transition(record, SKIPPED, error=record.get("status") or record.get("error"))
+
+    async def _create(self, record):
+        config = bgd.bgd_config(record, self.target_engine_version)
+        async with self._slots(record, "create"):
+            # a run that stopped while creating may already have created the BGD
+            created = None
+            if record["state"] == CREATING:
+                created = await self.backend.find_bgd(record["region_name"], config["BlueGreenDeploymentName"])
+            if created is None:
+                self._transition(record, CREATING)
+                created = await self.backend.create_bgd(record["region_name"], config)
+        self._transition(record, PROVISIONING, bgd_deployment_id=created["BlueGreenDeploymentIdentifier"],
+                         bgd_deployment_status=created["Status"])
+
+    async def _provision(self, record):
+        entry = await self._wait_for(record, ["AVAILABLE"])
+        if record["bgd_deployment_status"] != "AVAILABLE":
+            self._transition(record, FAILED, error=f"BGD ended in {record['bgd_deployment_status']}")
+        else:
+            self._transition(record, AVAILABLE, green_cluster_arn=entry["SwitchoverDetails"][0]["TargetMember"])
+
+    async def _verify(self, record):
+        engine_version, delay = None, None
+        while engine_version is None:
+            if delay is not None:
+                # the version couldn't be fetched, e.g. a failed describe; ask again like a status poll
+                await asyncio.sleep(delay * random.uniform(1 - bgd.POLL_JITTER, 1 + bgd.POLL_JITTER))
+            delay = self._next_delay("AVAILABLE", "AVAILABLE" if delay else None, delay)
+            engine_version = await self.backend.get_engine_version(record["region_name"], record["green_cluster_arn"])
+        if engine_version == self.target_engine_version:
+            self._transition(record, VERIFIED)
+        else:
+            self._transition(record, FAILED, bgd_deployment_status="DIFFERENT ENGINE VERSION IN GREEN",
+                             error=f"green engine version is {engine_version}, expected {self.target_engine_version}")
+
+    async def _switch(self, record):
+        async with self._slots(record, "switchover"):
+            # a run that stopped while switching may not have got the switchover accepted yet
+            if record["state"] == SWITCHING:
+                entry = await self._bgd(record)
+                record["bgd_deployment_status"] = entry["Status"] if entry else "ERROR"
+            if record["bgd_deployment_status"] == "AVAILABLE":
+                self._transition(record, SWITCHING)
+                if not await self.backend.switchover(record["region_name"], record["bgd_deployment_id"]):
+                    self._transition(record, FAILED, error="switchover could not be triggered")
+                    return
+                record["bgd_deployment_status"] = "SWITCHOVER_IN_PROGRESS"
+            if record["bgd_deployment_status"] in bgd.ACTIVE_BGD_STATUSES:
+                await self._wait_for(record, ["SWITCHOVER_COMPLETED"])
+
+        if record["bgd_deployment_status"] == "SWITCHOVER_COMPLETED":
+            self._transition(record, DONE)
+        else:
+            self._transition(record, FAILED, error=f"switchover ended in {record['bgd_deployment_status']}")
+
+    async def _run_cluster(self, record):
+        steps = {
+            DISCOVERED: self._check_eligibility,
+            ELIGIBLE: self._create,
+            CREATING: self._create,
+            PROVISIONING: self._provision,
+            AVAILABLE: self._verify,
+            VERIFIED: self._switch,
+            SWITCHING: self._switch,
+        }
+        try:
+            while record["state"] in steps:
+                await steps[record["state"]](record)
+        except Exception as e:
+            self._transition(record, FAILED, error=str(e))
+
+    async def _run_region(self, region_name, entries):
+        identifiers = [entry["db_cluster_identifier"] for entry in entries]
+        try:
+            found = await self.backend.describe_clusters(region_name, identifiers)
+        except Exception as e:
+            logger.error(f"🚨Error fetching cluster details in region {region_name}: {str(e)}")
+            found = {}
+
+        tasks = []
+        for db_cluster_identifier in identifiers:
+            record = self.records[db_cluster_identifier]
+            details = found.get(db_cluster_identifier.lower())
+            if not details:
+                self._transition(record, FAILED, error=f"No cluster found with identifier {db_cluster_identifier} in region {region_name}")
+                continue
+            self._transition(record, DISCOVERED, **details)
+            tasks.append(asyncio.create_task(self._run_cluster(record)))
+        await asyncio.gather(*tasks)
+
+    async def run(self, valid_input_entries: List[Dict[str, str]], resumed=None) -> Dict[str, Dict]:
+        """Run every entry to completion. resumed holds the records of an earlier run
+        (CheckpointJournal.replay output): in-flight clusters continue from their last state, done
+        and skipped ones are kept as they are, failed ones are retried, and no BGD is created twice."""
+        resumed = resumed or {}
+        entries_by_region = {}
+        tasks = []
+        for entry in valid_input_entries:
+            record = resumed.get(entry["db_cluster_identifier"])
+            if record and record.get("state") in (DONE, SKIPPED):
+                self.records[entry["db_cluster_identifier"]] = record
+                continue
+            state = resume_state(record) if record else None
+            if state:
+                record = dict(entry, **record)
+                record.pop("error", None)
+                record["state"] = state
+                self.records[entry["db_cluster_identifier"]] = record
+                logger.info(f"♻️ Resuming {entry['db_cluster_identifier']} from {state}")
+                tasks.append(self._run_cluster(record))
+                continue
+            self.records[entry["db_cluster_identifier"]] = dict(entry, state=None)
+            entries_by_region.setdefault(entry["region_name"], []).append(entry)
+
+        await asyncio.gather(*tasks, *(self._run_region(region_name, entries) for region_name, entries in entries_by_region.items()))
+        return self.records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run Blue Green Deployments for Aurora RDS clusters, each cluster independently')
+    parser.add_argument('--file', '-f', required=True, help='Path to the input CSV file with cluster,region')
+    parser.add_argument('--engine_version', '-e', required=True, help='Target engine version for BGD')
+    parser.add_argument('--min_touch_version', '-m', required=True, help='Minimum version for which you need to trigger BGD')
+    parser.add_argument('--region_limit', type=int, default=5, help='Max clusters per region creating a BGD at once')
+    parser.add_argument('--account_limit', type=int, default=20, help='Max clusters per account creating a BGD at once')
+    parser.add_argument('--switchover_region_limit', type=int, help='Max switchovers per region at once (default: --region_limit)')
+    parser.add_argument('--switchover_account_limit', type=int, help='Max switchovers per account at once (default: --account_limit)')
+    parser.add_argument('--wait_timeout', type=int, default=BGD_WAIT_TIMEOUT, help=f'Seconds a cluster may wait for its BGD to provision or switch over (default: {BGD_WAIT_TIMEOUT})')
+    parser.add_argument('--journal', '-j', default='orchestrator.jsonl', help='Checkpoint journal of cluster state transitions')
+    parser.add_argument('--resume', '-r', action='store_true', help='Resume in-flight clusters from the checkpoint journal')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.configure(args)
+
+    valid_input_entries, skipped_input_entries = bgd.read_input_file(args.file)
+    logger.info(f"⚠️ Final Skipped Input Entries: \n{json.dumps(skipped_input_entries, indent=4)}")
+
+    resumed = bgd.CheckpointJournal.replay(args.journal) if args.resume else None
+    journal = bgd.CheckpointJournal(args.journal, resume=args.resume)
+    orchestrator = BgdOrchestrator(Boto3RdsBackend(), args.engine_version, args.min_touch_version,
+                                   region_limit=args.region_limit, account_limit=args.account_limit,
+                                   switchover_region_limit=args.switchover_region_limit,
+                                   switchover_account_limit=args.switchover_account_limit,
+                                   wait_timeout=args.wait_timeout,
+                                   on_transition=lambda record: journal.record(record["db_cluster_identifier"], **record))
+    records = asyncio.run(orchestrator.run(valid_input_entries, resumed))
+    journal.close()
+
+    logger.info(f"🔥 Final Blue-Green Deployment Status:\n{json.dumps(records, indent=4)}")
+    client_stats = bgd.rds_client_pool.stats()
+    logger.info(f"🔌 RDS clients: {client_stats['created']} created, {client_stats['reused']} reused across {client_stats['regions']} regions")
+    logger.info(f"🚦 RDS requests: {bgd.request_scheduler.summary()}")
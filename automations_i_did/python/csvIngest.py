@@ -0,0 +1,128 @@
+"""
+Streaming ingestion of the input CSV files of the automation scripts.
+
+    stats = IngestStats(file_path)
+    for entry in iter_records(file_path, parse_row, stats):
+        ...
+    log_summary(logger, stats)
+
+parse_row turns one CSV row into a typed record or raises ValueError for a bad row. Rows are parsed
+one at a time as the consumer asks for them, so work on the first record starts while the rest of the
+file is still unread and nothing but the current row is held. Bad rows are counted per reason instead
+of being logged one by one; the first few are kept as samples for the summary. Blank lines are counted
+but are not bad rows.
+"""
+
+import csv
+from collections import Counter
+from typing import Callable, Iterator, List, Sequence, TypeVar
+
+import instrumentation
+
+SAMPLE_ROWS = 10
+
+Record = TypeVar("Record")
+
+
+class IngestStats:
+    """Counts of one pass over an input file; samples holds the first bad rows as (row number, row, error)."""
+
+    def __init__(self, source: str = "", sample_rows: int = SAMPLE_ROWS):
+        self.source = source
+        self.sample_rows = sample_rows
+        self.rows = 0
+        self.records = 0
+        self.blank = 0
+        self.header = False
+        self.reasons = Counter()
+        self.samples = []
+
+    @property
+    def skipped(self) -> int:
+        return sum(self.reasons.values())
+
+    def skip(self, row_number: int, row: List[str], error: ValueError):
+        # the reason is the message of the parser's own ValueError, kept generic so it can be counted;
+        # the value that made it fail travels as its cause and only shows up in the samples
+        self.reasons[str(error)] += 1
+        if len(self.samples) < self.sample_rows:
+            detail = f"{error} ({error.__cause__})" if error.__cause__ else str(error)
+            self.samples.append((row_number, row, detail))
+
+    def summary(self) -> str:
+        reasons = ", ".join(f"{number} {reason}" for reason, number in self.reasons.most_common())
+        skipped = f", {self.skipped} skipped ({reasons})" if self.reasons else ""
+        blank = f", {self.blank} blank" if self.blank else ""
+        header = ", 1 header" if self.header else ""
+        return f"Read {self.rows} rows from {self.source or 'input'}: {self.records} records{skipped}{blank}{header}"
+
+
+def expect_columns(row: Sequence[str], minimum: int, maximum: int = None):
+    maximum = minimum if maximum is None else maximum
+    if not minimum <= len(row) <= maximum:
+        expected = minimum if minimum == maximum else f"{minimum} to {maximum}"
+        raise ValueError(f"not {expected} columns")
+
+
+def iter_records(file_path: str, parse_row: Callable[[List[str]], Record], stats: IngestStats = None,
+                 optional_header: bool = False) -> Iterator[Record]:
+    """Yield parse_row(row) for every row of the CSV file that parses; the others are counted in stats.
+
+    With optional_header a first row that doesn't parse is taken as a header and not counted as bad.
+    Opening the file happens on the first next(), so OSError is raised there and not by this call.
+    """
+    stats = stats if stats is not None else IngestStats(file_path)
+    try:
+        with open(file_path, "r", encoding="utf-8-sig", newline="") as csv_file:
+            instrumentation.file_read(csv_file)
+            for row_number, row in enumerate(csv.reader(csv_file), 1):
+                stats.rows += 1
+                if not any(value.strip() for value in row):
+                    stats.blank += 1
+                    continue
+                try:
+                    record = parse_row(row)
+                except ValueError as e:
+                    if optional_header and row_number == 1:
+                        stats.header = True
+                    else:
+                        stats.skip(row_number, row, e)
+                    continue
+                stats.records += 1
+                yield record
+    finally:
+        # counted once per pass rather than per row
+        instrumentation.count("csv_rows_read", stats.rows)
+        instrumentation.count("csv_records", stats.records)
+        for reason, number in stats.reasons.items():
+            instrumentation.count("csv_rows_skipped", number, reason=reason)
+
+
+class CsvRecords:
+    """The records of a CSV file as a re-iterable: every iteration streams the file again.
+
+    For consumers that go over the records more than once (collect keys first, then apply), which
+    would otherwise need them all in a list. stats describes the latest pass.
+    """
+
+    def __init__(self, file_path: str, parse_row: Callable[[List[str]], Record], optional_header: bool = False):
+        self.file_path = file_path
+        self.parse_row = parse_row
+        self.optional_header = optional_header
+        self.stats = IngestStats(file_path)
+
+    def __iter__(self) -> Iterator[Record]:
+        self.stats = IngestStats(self.file_path)
+        return iter_records(self.file_path, self.parse_row, self.stats, self.optional_header)
+
+
+def log_summary(logger, stats: IngestStats):
+    """One info line with the counts, and a warning per sampled bad row when any row was skipped."""
+    if not stats.reasons:
+        logger.info(f"✅ {stats.summary()}")
+        return
+    logger.warning(f"⚠️ {stats.summary()}")
+    for row_number, row, detail in stats.samples:
+        logger.warning(f"Line {row_number} ignored, {detail}: {row}")
+    if stats.skipped > len(stats.samples):
+        logger.warning(f"... and {stats.skipped - len(stats.samples)} more ignored lines")
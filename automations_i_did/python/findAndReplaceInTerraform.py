@@ -3,52 +3,142 @@
 import sys
 import argparse
 
-def search_and_replace(file_path, substring, newMountValue):
-    try:
-        with open(file_path, "r") as file:
-            lines = file.readlines()
+import instrumentation
+from csvIngest import IngestStats, expect_columns, iter_records
+from tfvarsParser import TfvarsDocument, write_file_atomically
+from repoScanner import read_files
 
-        # Find the index of the line containing the specified substring
-        index = next((i for i, line in enumerate(lines) if substring in line), None)
+def size_assignments_by_block(doc):
+    """Map every block key to the first "size_in_gbs" assignment inside it, in one pass over the index."""
+    sizes = {}
+    for size in doc.find("size_in_gbs"):
+        for block_key in size.path:
+            sizes.setdefault(block_key, size)
+    return sizes
 
-        if index is not None:
-            # Find the index of the line containing "size_in_gbs" after the substring
-            size_index = next((i for i, line in enumerate(lines[index:]) if "size_in_gbs" in line), None)
+def size_assignment_after_value(doc, substring):
+    """(value, size): the first string value containing substring and the first "size_in_gbs" after it
+    in the same object, e.g. display_name = "dcprod018a-u01" then size_in_gbs = 100; None when missing."""
+    for assignment in doc.assignments:
+        if assignment.is_block or not doc.value_text(assignment).startswith('"') or substring not in doc.value(assignment):
+            continue
+        size = next((size for size in doc.find("size_in_gbs")
+                     if size.path == assignment.path and size.key_span > assignment.key_span), None)
+        return assignment, size
+    return None, None
 
-            if size_index is not None:
-                # Print the values before replacement
-                print(f"Before replacement - Substring: {substring}, old_size: {lines[index + size_index].strip()}")        
-                # Replace the line containing "size_in_gbs" with "newsize"
-                lines[index + size_index] = f"    size_in_gbs           = {newMountValue}\n"
-                # Print the values after replacement
-                print(f"After replacement - Substring: {substring}, new_size: size_in_gbs           = {newMountValue}")     
+def size_assignment_after_text(doc, substring):
+    """(True, size): the first "size_in_gbs" after the first occurrence of substring anywhere in the text,
+    e.g. in a comment; (False, None) when substring isn't in the text."""
+    position = doc.text.find(substring)
+    if position == -1:
+        return False, None
+    return True, next((size for size in doc.find("size_in_gbs") if size.key_span[0] > position), None)
 
-                # Write the modified lines back to the file
-                with open(file_path, "w") as file:
-                    file.writelines(lines)
+def read_tfvars(file_path):
+    with open(file_path, "r", newline="") as file:
+        instrumentation.file_read(file)
+        return file.read()
+
+@instrumentation.timed()
+def resize_mounts_in_file(file_path, changes, text=None):
+    """Apply every (substring, newMountValue) change to one file: one parse, one atomic write.
+    text is the file's content when it was read already, or the exception reading it raised."""
+    try:
+        if isinstance(text, Exception):
+            raise text
+        doc = TfvarsDocument(read_tfvars(file_path) if text is None else text)
 
-                print("Replacement completed.")
+        # Block keys in file order (the volume, e.g. dcprod018a-u01 or dcprod018a-u01-data) and their first "size_in_gbs"
+        blocks = list(dict.fromkeys(a.key for a in doc.assignments if a.is_block))
+        sizes = size_assignments_by_block(doc)
+
+        for substring, newMountValue in changes:
+            # a block keyed exactly by the substring, else the first block key containing it
+            block = substring if substring in blocks else next((key for key in blocks if substring in key), None)
+            if block is not None:
+                size = sizes.get(block)
             else:
+                # or a volume named in a string value, with its size in the same object
+                value, size = size_assignment_after_value(doc, substring)
+                if value is None:
+                    # or named anywhere else, e.g. in a comment, with the next size after it
+                    found, size = size_assignment_after_text(doc, substring)
+                    if not found:
+                        print("Error: Substring not found in the file.")
+                        continue
+            if size is None:
                 print("Error: 'size_in_gbs' not found after the specified substring.")
-        else:
-            print("Error: Substring not found in the file.")
+                continue
+
+            # Print the values before replacement
+            old_line = doc.line_text(size)
+            print(f"Before replacement - Substring: {substring}, old_size: {old_line.strip()}")
+            # Replace only the value of "size_in_gbs", keeping the line's formatting
+            instrumentation.count("matches_found", kind="size_in_gbs")
+            doc.set(size, newMountValue, raw=True)
+            line_start = doc.text.rfind("\n", 0, size.key_span[0]) + 1
+            new_line = old_line[:size.value_span[0] - line_start] + newMountValue + old_line[size.value_span[1] - line_start:]
+            # Print the values after replacement
+            print(f"After replacement - Substring: {substring}, new_size: {new_line.strip()}")
+
+        # Write the modified text back to the file, once
+        if doc.changed:
+            write_file_atomically(file_path, doc.render())
+            print("Replacement completed.")
 
     except FileNotFoundError:
         print(f"Error: File not found at path {file_path}")
     except Exception as e:
         print(f"An error occurred: {e}")
 
+def search_and_replace(file_path, substring, newMountValue):
+    resize_mounts_in_file(file_path, [(substring, newMountValue)])
+
+def parse_resize_row(row):
+    expect_columns(row, 3)
+    file_path, substring, newMountValue = (value.strip() for value in row)
+    if not newMountValue.isdigit():
+        raise ValueError("size is not a number")
+    return file_path, substring, newMountValue
+
+def read_resize_csv(csv_path):
+    """Rows of file,server-mount,size grouped by file, in CSV order; a header row is skipped."""
+    changes_by_file = {}
+    stats = IngestStats(csv_path)
+    for file_path, substring, newMountValue in iter_records(csv_path, parse_resize_row, stats, optional_header=True):
+        changes_by_file.setdefault(file_path, []).append((substring, newMountValue))
+    if stats.skipped:
+        print(f"Error: {stats.summary()}")
+        for row_number, row, detail in stats.samples:
+            print(f"Error: Ignoring line {row_number} ({detail}): {row}")
+    return changes_by_file
+
+@instrumentation.timed()
+def bulk_search_and_replace(csv_path):
+    changes_by_file = read_resize_csv(csv_path)
+    # files are read ahead on a thread pool, which hides the latency of network-mounted checkouts
+    for file_path, text in read_files(changes_by_file, read_tfvars):
+        print(f"Processing {file_path} ({len(changes_by_file[file_path])} changes)")
+        resize_mounts_in_file(file_path, changes_by_file[file_path], text)
+
 if __name__ == "__main__":
     # Create an argument parser
     parser = argparse.ArgumentParser(description="Search for lines containing a substring and replace 'size_in_gbs' with a new value.")
-    parser.add_argument("-f", "--file", required=True, help="Path to the input file")
-    parser.add_argument("-s", "--substring", required=True, help="Servername(Substring) to search for in each line")
-    parser.add_argument("-v", "--newMountValue", required=True, help="New mount value to replace in the tfvars")
+    parser.add_argument("-f", "--file", help="Path to the input file")
+    parser.add_argument("-s", "--substring", help="Servername(Substring) to search for in each line")
+    parser.add_argument("-v", "--newMountValue", help="New mount value to replace in the tfvars")
+    parser.add_argument("-c", "--csv", help="CSV of file,server-mount,size rows; every file is read and written once")
+    instrumentation.add_arguments(parser)
 
     # Parse the command-line arguments
     args = parser.parse_args()
+    instrumentation.configure(args)
 
     # Call the function with arguments
-    search_and_replace(args.file, args.substring, args.newMountValue)
-
-
+    if args.csv:
+        bulk_search_and_replace(args.csv)
+    elif args.file and args.substring and args.newMountValue:
+        search_and_replace(args.file, args.substring, args.newMountValue)
+    else:
+        parser.error("either --csv or all of --file, --substring and --newMountValue are required")
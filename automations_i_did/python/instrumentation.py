@@ -0,0 +1,285 @@
+"""
+Opt-in counters and timers for the automation scripts.
+
+Nothing is recorded until enable() is called, which the scripts do for --metrics or any of the
+export options add_arguments() adds. Until then count() and timer() return after a single flag check.
+
+    instrumentation.count("files_walked")
+    with instrumentation.timer("resize_mounts_in_file", file=file_path):
+        ...
+
+At exit the counters and timers are printed as a table on stderr. On request they are also written
+as a Chrome trace (chrome://tracing or ui.perfetto.dev), a Prometheus textfile or JSON.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+import contextlib
+
+PROMETHEUS_PREFIX = "terraform_automation"
+
+_enabled = False
+_tracing = False
+_lock = threading.Lock()
+_counters = {}   # (name, ((label, value), ...)) -> value
+_timers = {}     # name -> [calls, total seconds, longest seconds]
+_events = []     # Chrome trace events, kept only while tracing
+_started = time.time()
+_EPOCH = time.time() - time.perf_counter()  # perf_counter -> epoch seconds, so traces of several processes line up
+_NULL_TIMER = contextlib.nullcontext()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def tracing() -> bool:
+    return _tracing
+
+
+def enable(trace: bool = False, reset: bool = False):
+    """Start recording; with trace every timed section is also kept as a trace event.
+    reset drops what was recorded so far (a forked worker inherits its parent's numbers)."""
+    global _enabled, _tracing, _started
+    with _lock:
+        if reset:
+            _counters.clear()
+            _timers.clear()
+            _events.clear()
+        if not _enabled or reset:
+            _started = time.time()
+        _enabled, _tracing = True, trace
+
+
+def count(name: str, amount=1, **labels):
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def file_read(f):
+    """Count one file read through the open file object f, by its size on disk."""
+    if _enabled:
+        count("files_read")
+        count("bytes_read", os.fstat(f.fileno()).st_size)
+
+
+def file_written(path: str):
+    if _enabled:
+        count("files_written")
+        count("bytes_written", os.path.getsize(path))
+
+
+def _record(name, start, end, args):
+    elapsed = end - start
+    with _lock:
+        stats = _timers.get(name)
+        if stats is None:
+            stats = _timers[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+        if _tracing:
+            _events.append({"name": name, "ph": "X", "ts": (_EPOCH + start) * 1e6, "dur": elapsed * 1e6,
+                            "pid": os.getpid(), "tid": threading.get_ident(), "args": args})
+
+
+class _Timer:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _record(self.name, self.start, time.perf_counter(), self.args)
+
+
+def timer(name: str, **args):
+    """Context manager timing one section; args only show up in the trace."""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name, {key: str(value) for key, value in args.items()})
+
+
+def timed(name: str = None):
+    """Decorator timing every call of a function, under name or the function's own name."""
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Timer(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+#worker processes - metrics recorded in a pool worker travel back with each result
+def drain() -> dict:
+    """Everything recorded so far, which is then forgotten."""
+    with _lock:
+        snapshot = {"counters": dict(_counters), "timers": {name: list(stats) for name, stats in _timers.items()},
+                    "events": list(_events)}
+        _counters.clear()
+        _timers.clear()
+        _events.clear()
+    return snapshot
+
+
+def call_and_drain(fn, *args):
+    return fn(*args), drain()
+
+
+def merge(snapshot: dict):
+    with _lock:
+        for key, value in snapshot["counters"].items():
+            _counters[key] = _counters.get(key, 0) + value
+        for name, (calls, total, longest) in snapshot["timers"].items():
+            stats = _timers.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += calls
+            stats[1] += total
+            stats[2] = max(stats[2], longest)
+        if _tracing:
+            _events.extend(snapshot["events"])
+
+
+#reports
+def _label_text(labels) -> str:
+    return ",".join(f"{key}={value}" for key, value in labels)
+
+
+def _number(value) -> str:
+    return f"{value:,.3f}" if isinstance(value, float) else f"{value:,}"
+
+
+def summary() -> str:
+    """Counters and timers as a table; timers slowest first."""
+    with _lock:
+        counters = sorted(_counters.items())
+        timers = sorted(_timers.items(), key=lambda item: item[1][1], reverse=True)
+    lines = [f"📊 Metrics after {time.time() - _started:.2f}s"]
+    if counters:
+        names = [name + (f"{{{_label_text(labels)}}}" if labels else "") for (name, labels), _ in counters]
+        width = max(40, *map(len, names))
+        lines.append(f"{'counter':<{width}} {'value':>16}")
+        lines += [f"{name:<{width}} {_number(value):>16}" for name, (_, value) in zip(names, counters)]
+    if timers:
+        width = max(40, *(len(name) for name, _ in timers))
+        lines.append(f"{'timer':<{width}} {'calls':>8} {'total s':>10} {'mean ms':>10} {'max ms':>10}")
+        for name, (calls, total, longest) in timers:
+            lines.append(f"{name:<{width}} {calls:>8} {total:>10.3f} {total / calls * 1e3:>10.2f} {longest * 1e3:>10.2f}")
+    return "\n".join(lines)
+
+
+def _write_atomically(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_chrome_trace(path: str, script: str):
+    with _lock:
+        events = [{"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": script}}] + list(_events)
+        counters = {name + (f"{{{_label_text(labels)}}}" if labels else ""): value
+                    for (name, labels), value in sorted(_counters.items())}
+    _write_atomically(path, json.dumps({"traceEvents": events, "displayTimeUnit": "ms",
+                                        "otherData": {"script": script, "counters": counters}}))
+
+
+def _metric_name(name: str) -> str:
+    return f"{PROMETHEUS_PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prometheus_labels(labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels) + "}"
+
+
+def prometheus_text(script: str) -> str:
+    """The metrics in the Prometheus text exposition format, as node_exporter's textfile collector reads it."""
+    script_label = (("script", script),)
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        timers = sorted(_timers.items())
+    previous = None
+    for (name, labels), value in counters:
+        metric = _metric_name(name) + "_total"
+        if metric != previous:
+            lines.append(f"# TYPE {metric} counter")
+            previous = metric
+        lines.append(f"{metric}{_prometheus_labels(script_label + labels)} {value}")
+    for suffix, kind, column in (("timer_calls_total", "counter", 0), ("timer_seconds_total", "counter", 1),
+                                 ("timer_max_seconds", "gauge", 2)):
+        if timers:
+            lines.append(f"# TYPE {_metric_name(suffix)} {kind}")
+        lines += [f"{_metric_name(suffix)}{_prometheus_labels(script_label + (('timer', name),))} {stats[column]}"
+                  for name, stats in timers]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str, script: str):
+    # written to a temp file and renamed, so the collector never reads half a file
+    _write_atomically(path, prometheus_text(script))
+
+
+def write_json(path: str, script: str):
+    with _lock:
+        data = {
+            "script": script,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(_started)),
+            "elapsed_seconds": round(time.time() - _started, 3),
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(_counters.items())],
+            "timers": [{"name": name, "calls": calls, "seconds": total, "max_seconds": longest}
+                       for name, (calls, total, longest) in sorted(_timers.items())],
+        }
+    _write_atomically(path, json.dumps(data, indent=2))
+
+
+def report(script: str, trace_file: str = None, prometheus_file: str = None, json_file: str = None):
+    print(summary(), file=sys.stderr)
+    for path, write in ((trace_file, write_chrome_trace), (prometheus_file, write_prometheus), (json_file, write_json)):
+        if path:
+            try:
+                write(path, script)
+            except OSError as e:
+                print(f"⚠️ Could not write metrics to {path}: {e}", file=sys.stderr)
+
+
+#command line
+def add_arguments(parser):
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument('--metrics', action='store_true', help='Record counters and timings and print a summary table at exit')
+    group.add_argument('--trace-file', help='Write a Chrome trace of the timed sections to this file (implies --metrics)')
+    group.add_argument('--prometheus-file', help='Write the metrics in Prometheus textfile format to this file (implies --metrics)')
+    group.add_argument('--metrics-json', help='Write the metrics as JSON to this file (implies --metrics)')
+
+
+def configure(args) -> bool:
+    """Enable recording when the options of add_arguments ask for it, and report at exit."""
+    if not (args.metrics or args.trace_file or args.prometheus_file or args.metrics_json):
+        return False
+    enable(trace=bool(args.trace_file))
+    script = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    atexit.register(report, script, args.trace_file, args.prometheus_file, args.metrics_json)
+    return True
@@ -0,0 +1,168 @@
+"""
+Rate-limit-aware scheduler for RDS API calls.
+
+Every call made through an attached client first takes a token from the bucket of its
+(region, API), so a fleet-wide run stays under the RDS request rate however many threads
+or clusters are in flight. Calls wrapped with call() are retried with exponential backoff
+and jitter when RDS throttles them, instead of being dropped.
+"""
+
+import time
+import random
+import threading
+import logging
+from typing import Dict, Tuple
+
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# error codes RDS / botocore use for request throttling
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+}
+
+# requests per second and burst per (region, API); anything else uses DEFAULT_API_RATE
+DEFAULT_API_RATES = {
+    "DescribeDBClusters": (10.0, 20),
+    "DescribeBlueGreenDeployments": (10.0, 20),
+    "CreateBlueGreenDeployment": (1.0, 3),
+    "SwitchoverBlueGreenDeployment": (1.0, 3),
+}
+DEFAULT_API_RATE = (5.0, 10)
+
+
+def is_throttling_error(e):
+    code = getattr(e, "response", {}).get("Error", {}).get("Code")
+    return code in THROTTLING_ERROR_CODES
+
+
+class TokenBucket:
+    """Classic token bucket; reserve() takes a token and returns how long to wait before using it.
+
+    Tokens may go negative, so waiting callers are served in the order they arrived.
+    """
+
+    def __init__(self, rate: float, capacity: int, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RdsRequestScheduler:
+    """Per-region, per-API token buckets plus retries on throttling, shared by all RDS calls.
+
+    metrics() reports per (region, API) calls, throttles, retries, seconds spent waiting and the
+    deepest queue of callers waiting for a token.
+    """
+
+    def __init__(self, rates=None, max_retries=6, base_delay=0.5, max_delay=20.0, sleep=time.sleep, clock=time.monotonic):
+        self.rates = dict(DEFAULT_API_RATES, **(rates or {}))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.clock = clock
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.queue_depth = 0
+
+    def _bucket(self, key: Tuple[str, str]) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate, burst = self.rates.get(key[1], DEFAULT_API_RATE)
+                bucket = self._buckets[key] = TokenBucket(rate, burst, self.clock)
+                self._stats[key] = {"calls": 0, "throttles": 0, "retries": 0, "waited_seconds": 0.0, "max_queue_depth": 0}
+            return bucket
+
+    def _count(self, key, field, amount=1):
+        with self._lock:
+            self._stats[key][field] += amount
+
+    def acquire(self, region_name: str, api: str):
+        """Block until the (region, API) bucket lets one more request through."""
+        key = (region_name, api)
+        delay = self._bucket(key).reserve()
+        instrumentation.count("api_calls", region=region_name, api=api)
+        if delay > 0:
+            instrumentation.count("api_wait_seconds", delay, region=region_name, api=api)
+        with self._lock:
+            stats = self._stats[key]
+            stats["calls"] += 1
+            if delay > 0:
+                self.queue_depth += 1
+                stats["max_queue_depth"] = max(stats["max_queue_depth"], self.queue_depth)
+                stats["waited_seconds"] += delay
+        if delay > 0:
+            try:
+                self.sleep(delay)
+            finally:
+                with self._lock:
+                    self.queue_depth -= 1
+
+    def call(self, region_name: str, api: str, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs), retrying with exponential backoff and full jitter when it is throttled."""
+        key = (region_name, api)
+        self._bucket(key)
+        for attempt in range(self.max_retries + 1):
+            try:
+                with instrumentation.timer(f"rds.{api}", region=region_name):
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_throttling_error(e) or attempt == self.max_retries:
+                    raise
+                instrumentation.count("api_throttles", region=region_name, api=api)
+                self._count(key, "throttles")
+                self._count(key, "retries")
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                logger.warning(f"🐢 {api} throttled in {region_name}, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                self.sleep(delay)
+
+    def attach(self, client, region_name: str):
+        """Make every request of a boto3 client, paginator pages included, wait for its token first."""
+        def before_call(model, **kwargs):
+            self.acquire(region_name, model.name)
+
+        def count_throttles(response, operation, **kwargs):
+            # botocore's own retries: response is (http_response, parsed) or None
+            parsed = response[1] if response else {}
+            if parsed.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES:
+                self._bucket((region_name, operation.name))
+                self._count((region_name, operation.name), "throttles")
+                instrumentation.count("api_throttles", region=region_name, api=operation.name)
+
+        # before-parameter-build runs once per API call like before-call, but every handler sees it:
+        # a before-call handler that answers the call (botocore's Stubber) would skip this one
+        client.meta.events.register("before-parameter-build.rds", before_call)
+        client.meta.events.register("needs-retry.rds", count_throttles)
+        return client
+
+    def metrics(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {f"{region_name}/{api}": dict(stats) for (region_name, api), stats in sorted(self._stats.items())}
+
+    def summary(self) -> str:
+        metrics = self.metrics()
+        calls = sum(m["calls"] for m in metrics.values())
+        throttles = sum(m["throttles"] for m in metrics.values())
+        waited = sum(m["waited_seconds"] for m in metrics.values())
+        deepest = max((m["max_queue_depth"] for m in metrics.values()), default=0)
+        return f"{calls} calls, {throttles} throttled, {waited:.1f}s waiting for tokens, max queue depth {deepest}"
@@ -7,58 +7,105 @@ import json
 import argparse
 import logging
 import os
-import sys
-import csv
-from typing import Tuple, Dict, List
+import hashlib
+from typing import Tuple, Dict, List, Iterable, Iterator
 import subprocess
 
+import instrumentation
+from csvIngest import CsvRecords, IngestStats, expect_columns, iter_records, log_summary
+from tfvarsParser import TfvarsDocument, write_file_atomically
+from repoScanner import DEFAULT_EXCLUDES, READ_WORKERS, PatternMatcher, ScanStats, iter_files, read_files
+
 #logging
 logging.basicConfig(format="%(levelname)s: %(asctime)s %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def read_input_file(file_path: str) -> Tuple[List[Dict[str, str]], List[List[str]]]:
-    
+TAG_COLUMNS = ("servernamexxxxx", "owner", "product_line", "environment", "application", "product_name", "customer_name")
+
+
+def parse_input_row(line: List[str]) -> Dict[str, str]:
+    expect_columns(line, len(TAG_COLUMNS))
+    entry = dict(zip(TAG_COLUMNS, (value.strip() for value in line)))
+    # the last character of the servername column is dropped when searching, so it needs at least two
+    if len(entry["servernamexxxxx"]) < 2:
+        raise ValueError("servername missing")
+    return entry
+
+
+def iter_input_entries(file_path: str, stats: IngestStats = None) -> Iterator[Dict[str, str]]:
+    """The entries of the input CSV one at a time; bad rows are counted in stats instead of returned."""
+    return iter_records(file_path, parse_input_row, stats)
+
+
+def read_input_file(file_path: str) -> Tuple[List[Dict[str, str]], IngestStats]:
+    stats = IngestStats(file_path)
+    return list(iter_input_entries(file_path, stats)), stats
+
+
+def _load_servername_index(index_file, names_key):
     try:
-        with open(file_path, mode='r', encoding='utf-8-sig') as csv_file:
-            csv_reader = csv.reader(csv_file)
-            for line in csv_reader:
-                if len(line) == 7:
-                    entry = {
-                        "servernamexxxxx"            : line[0].strip(),
-                        "owner"         : line[1].strip(),
-                        "product_line"  : line[2].strip(),
-                        "environment"   : line[3].strip(),
-                        "application"   : line[4].strip(),
-                        "product_name"  : line[5].strip(),
-                        "customer_name" : line[6].strip(),
-                        # "region"        : line[7].strip()
-                    }
-                    formatted_entries.append(entry)
-                else: 
-                    logger.warning("This line is ignored: " + line)
-                    skipped_entries.append(line)
-                
-        return formatted_entries, skipped_entries
+        with open(index_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("servernames") == names_key:
+            return data.get("files", {})
+    except (OSError, ValueError):
+        pass
+    return {}
 
-    except Exception as e:
-        logger.error("ERROR: " + str(e))
 
+@instrumentation.timed()
+def build_servername_index(servernames: Iterable[str], repodir: str, index_file: str = None,
+                           exclude=DEFAULT_EXCLUDES, max_workers: int = READ_WORKERS) -> Dict[str, List[str]]:
+    """Map every servername to the .tfvars files under repodir that contain it.
+
+    Each .tfvars file is read once, on a pool of max_workers threads, and searched for all servernames
+    with a single compiled matcher. Directories matching exclude are not scanned. With index_file the
+    per-file matches are persisted, and files whose size and mtime haven't changed are not read again
+    as long as the set of servernames is the same.
+    """
+    servernames = sorted(set(servernames))
+    if not servernames:
+        logger.warning("No servernames to look for, the .tfvars files are not scanned")
+        return {}
+    names_key = hashlib.sha256("\n".join(servernames).encode('utf-8')).hexdigest()
+    stored = _load_servername_index(index_file, names_key) if index_file else {}
+    matcher = PatternMatcher(servernames)
+    index = {servername: [] for servername in servernames}
+    files = {}
+    stats = ScanStats()
 
-def find_tfvars_files_containing_servername(servername, repodir):
-    matched_files = []
+    def index_entry(file_path):
+        stat = os.stat(file_path)
+        entry = stored.get(file_path)
+        if not entry or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            # the raw bytes are searched; the file is decoded only when it isn't pure ASCII
+            found = matcher.search_file(file_path)
+            instrumentation.count("matches_found", len(found), kind="servername")
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "servernames": sorted(found)}
+        return entry
 
-    #find matching files with the servername/clustername
-    for root, _, files in os.walk(repodir):
-        for file in files:
-            if file.endswith(".tfvars"):
-                file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        if servername in f.read():
-                            matched_files.append(file_path)
-                except Exception as e:
-                    logger.error(f"Error reading {file_path}: {e}")
+    for file_path, entry in read_files(iter_files(repodir, ["*.tfvars"], exclude, stats), index_entry, max_workers, stats):
+        if isinstance(entry, Exception):
+            logger.error(f"Error reading {file_path}: {entry}")
+            continue
+        files[file_path] = entry
+        for servername in entry["servernames"]:
+            index[servername].append(file_path)
+
+    if index_file:
+        tmp_file = f"{index_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"servernames": names_key, "files": files}, f)
+        os.replace(tmp_file, index_file)
+
+    logger.info(f"Indexed {len(files)} .tfvars files for {len(servernames)} servernames")
+    logger.info(stats.summary())
+    return index
+
+
+def lookup_tfvars_files_containing_servername(servername, index, repodir):
+    matched_files = index.get(servername, [])
 
     if matched_files:
         logger.info(f"Matching files for {servername} found")
@@ -66,35 +113,83 @@ def find_tfvars_files_containing_servername(servername, repodir):
         print("*"*40)
     else:
         logger.warning(f"No matching .tfvars files found for {servername} in {repodir}")
-        sys.exit()
 
     return matched_files
 
+
+@instrumentation.timed()
+def apply_entries(text, entries):
+    """Set the tag values of each entry, in entry order, on the assignments named exactly like its keys
+    inside the blocks of its server (block keys containing the servername used to find the file).
+
+    Where no block key contains the servername (the servername only in a value such as
+    hostname = "dcprod018a"), the entry applies inside the innermost object holding such a value,
+    nested objects included; an entry whose servername is in neither matches nothing.
+    Only the value of a matched assignment is replaced; the rest of the file is left byte for byte.
+    Returns (new text, True if any assignment was matched).
+    """
+    doc = TfvarsDocument(text)
+    updated = False
+
+    entries_by_servername = {}
+    for position, entry in enumerate(entries):
+        entries_by_servername.setdefault(entry["servernamexxxxx"][:-1], []).append((position, entry))
+    keys = set().union(*entries)
+    lengths = {len(servername) for servername in entries_by_servername}
+    servernames_in = {}  # block key -> servernames it contains
+
+    def servernames_in_block(block_key):
+        if block_key not in servernames_in:
+            substrings = {block_key[i:i + n] for n in lengths for i in range(len(block_key) - n + 1)}
+            servernames_in[block_key] = [s for s in substrings if s in entries_by_servername]
+        return servernames_in[block_key]
+
+    block_keys = {block_key for a in doc.assignments for block_key in a.path + ((a.key,) if a.is_block else ())}
+    in_blocks = {servername for block_key in block_keys for servername in servernames_in_block(block_key)}
+    # servers without a block of their own here: scope their entries to the objects naming them in a value
+    by_value = [servername for servername in entries_by_servername if servername not in in_blocks]
+    entries_by_scope = {}  # path of an object -> entries applying inside it
+    if by_value:
+        for assignment in doc.assignments:
+            if assignment.is_block:
+                continue
+            value_text = doc.value_text(assignment)
+            for servername in by_value:
+                if servername in value_text:
+                    entries_by_scope.setdefault(assignment.path, {}).update(
+                        (position, entry) for position, entry in entries_by_servername[servername])
+
+    for assignment in doc.assignments:
+        if assignment.key not in keys or assignment.is_block:
+            continue
+        candidates = []
+        for depth in range(len(assignment.path) + 1):
+            candidates.extend(pair for pair in entries_by_scope.get(assignment.path[:depth], {}).items()
+                              if assignment.key in pair[1])
+        for block_key in assignment.path:
+            for servername in servernames_in_block(block_key):
+                candidates.extend(pair for pair in entries_by_servername[servername] if assignment.key in pair[1])
+        if candidates:
+            # the last entry in input order wins, as if entries were applied one after another
+            doc.set(assignment, max(candidates, key=lambda pair: pair[0])[1][assignment.key])
+            instrumentation.count("matches_found", kind="tag")
+            updated = True
+
+    return doc.render(), updated
+
+
 def replace_values(matched_files, input):
     for file in matched_files:
         try:
-            with open(file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            updated = False
-
-            for entry in input:
-                # last_key = list(entry.keys())[-1]
-                for i in range(len(lines)):
-                    for key, value in entry.items():
-                        if key in lines[i]:
-                            # if key == last_key:
-                                # lines[i] = f'      "{key}"   = "{value}"\n'
-                            # else:
-                                lines[i] = f'      "{key}"   = "{value}",\n'
-                            
-                            # logger.info(f"Updated in {file}: {lines[i].strip()}")
-                                updated = True  
+            with open(file, 'r', encoding='utf-8', newline='') as f:
+                instrumentation.file_read(f)
+                text = f.read()
+
+            text, updated = apply_entries(text, input)
 
             # Write the modified content back to the same file
             if updated:
-                with open(file, 'w', encoding='utf-8') as f:
-                    f.writelines(lines)
+                write_file_atomically(file, text)
                 logger.info(f"File {file} updated successfully.")
             else:
                 logger.info(f"No matches found in {file}. No changes made.")
@@ -103,25 +198,58 @@ def replace_values(matched_files, input):
             logger.error(f"Error processing {file}: {e}")
 
 
+def group_entries_by_file(input, index, repodir):
+    """Group CSV entries by the .tfvars files they touch, keeping CSV order within each file."""
+    entries_by_file = {}
 
-
-    
-def find_file_and_replace_values(input, repodir):
     for item in input:
         servername = item["servernamexxxxx"][:-1]
-        matched_files = find_tfvars_files_containing_servername(servername, repodir)
+        matched_files = lookup_tfvars_files_containing_servername(servername, index, repodir)
 
         if matched_files:
             for file in matched_files:
-                # logger.info(f"Found matching file: {file}")
-                replace_values(matched_files, [item])
+                entries_by_file.setdefault(file, []).append(item)
         else:
             logger.warning(f"No matching files found for {servername}")
-        
-        
 
+    return entries_by_file
+
+
+def replace_values_in_file(file, entries):
+    """Apply all entries for one file with a single read and a single atomic write."""
+    try:
+        with open(file, 'r', encoding='utf-8', newline='') as f:
+            instrumentation.file_read(f)
+            text = f.read()
+
+        text, updated = apply_entries(text, entries)
+        if updated:
+            write_file_atomically(file, text)
+            logger.info(f"File {file} updated successfully with {len(entries)} entries.")
+        else:
+            logger.info(f"No matches found in {file}. No changes made.")
+
+    except Exception as e:
+        logger.error(f"Error processing {file}: {e}")
+
+
+@instrumentation.timed()
+def find_file_and_replace_values(input, repodir, index_file=None, batch=False, exclude=DEFAULT_EXCLUDES, max_workers=READ_WORKERS):
+    index = build_servername_index((item["servernamexxxxx"][:-1] for item in input), repodir, index_file, exclude, max_workers)
+
+    if batch:
+        for file, entries in group_entries_by_file(input, index, repodir).items():
+            replace_values_in_file(file, entries)
+        return
 
+    for item in input:
+        servername = item["servernamexxxxx"][:-1]
+        matched_files = lookup_tfvars_files_containing_servername(servername, index, repodir)
 
+        if matched_files:
+            replace_values(matched_files, [item])
+        else:
+            logger.warning(f"No matching files found for {servername}")
 
 
 #main
@@ -129,15 +257,24 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Read CSV and replace values in TF Code')
     parser.add_argument('--file', '-f', required=True, help='Input CSV File')
     parser.add_argument('--path', '-p', required=True, help='Repo path where the files should be replaced with values')
+    parser.add_argument('--index', '-i', help='Optional file to persist the servername -> .tfvars index between runs')
+    parser.add_argument('--batch', '-b', action='store_true', help='Group entries by file and rewrite each .tfvars file once')
+    parser.add_argument('--exclude', '-x', action='append', help=f'Glob of files/directories to skip, repeatable (default: {", ".join(DEFAULT_EXCLUDES)})')
+    parser.add_argument('--workers', '-w', type=int, default=READ_WORKERS, help='Threads reading .tfvars files')
+    instrumentation.add_arguments(parser)
     args = parser.parse_args()
+    instrumentation.configure(args)
 
-    formatted_entries = []
-    skipped_entries = []
-    formatted_entries, skipped_entries = read_input_file(args.file)
-    logger.info(json.dumps(formatted_entries, indent=4))
+    #entries are streamed from the CSV on every pass (servernames for the index, then the replacements)
+    #instead of being held in a list, so large inventories need memory for the servernames only
+    if not os.path.isfile(args.file):
+        parser.error(f"input CSV file not found: {args.file}")
+    entries = CsvRecords(args.file, parse_input_row)
 
-    #for servername in formatted entries, find the matching files inside the repo 
+    #for servername in the entries, find the matching files inside the repo
     #and replace values with the matching line if line starts/contains with key, replace with "k" = "v"
-    find_file_and_replace_values(formatted_entries, args.path)
+    find_file_and_replace_values(entries, args.path, args.index, args.batch,
+                                 args.exclude or DEFAULT_EXCLUDES, args.workers)
+    log_summary(logger, entries.stats)
 
 
@@ -0,0 +1,273 @@
+"""
+Repository file discovery on os.scandir, with reads fanned out to a thread pool.
+
+    stats = ScanStats()
+    for path, text in read_files(iter_files(repodir, ["*.tfvars"], stats=stats), stats=stats):
+        ...
+    logger.info(stats.summary())
+
+Directories matching an exclude glob (.git and .terraform by default) are pruned before they are
+listed. Files come out in the same order os.walk would give them, so results stay deterministic.
+find_in_file answers "which of these strings does the file contain" on a memory map of its bytes;
+PatternMatcher does the same for many strings with a single compiled regex.
+"""
+
+import os
+import re
+import codecs
+import mmap
+import time
+import fnmatch
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Sequence, Set, Tuple
+
+import instrumentation
+
+DEFAULT_EXCLUDES = (".git", ".terraform")
+READ_WORKERS = 8
+READ_AHEAD = 4  # reads in flight per worker
+# below this size reading the bytes is cheaper than setting up a memory map
+MMAP_THRESHOLD = 1 << 20
+MMAP_CHUNK = 1 << 20
+
+
+class ScanStats:
+    """Counts of one scan; files_per_second covers the time from creation to the last file read."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = self.started
+        self.directories = 0
+        self.pruned = 0
+        self.files = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def file_read(self, size: int):
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            self.finished = time.perf_counter()
+
+    @property
+    def files_per_second(self) -> float:
+        elapsed = self.finished - self.started
+        return self.files / elapsed if elapsed > 0 else float(self.files)
+
+    def summary(self) -> str:
+        size = f" ({self.bytes / 1e6:.1f} MB)" if self.bytes else ""
+        return (f"Scanned {self.files} files{size} in {self.directories} directories, "
+                f"{self.pruned} pruned, {self.files_per_second:.0f} files/s")
+
+
+def _matches(name: str, relative_path: str, patterns: Sequence[str]) -> bool:
+    return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(relative_path, p) for p in patterns)
+
+
+def iter_files(root: str, include: Sequence[str] = ("*",), exclude: Sequence[str] = DEFAULT_EXCLUDES,
+               stats: ScanStats = None) -> Iterator[str]:
+    """Yield paths of files below root whose name or root-relative path matches an include glob
+    and no exclude glob. Like os.walk, symlinked directories are not followed."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        if stats:
+            stats.directories += 1
+        instrumentation.count("directories_walked")
+        subdirectories = []
+        try:
+            with os.scandir(directory) as entries:
+                entries = list(entries)
+        except OSError:
+            continue
+        for entry in entries:
+            relative_path = os.path.relpath(entry.path, root)
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if _matches(entry.name, relative_path, exclude):
+                if is_dir:
+                    if stats:
+                        stats.pruned += 1
+                    instrumentation.count("directories_pruned")
+                continue
+            if is_dir:
+                if not entry.is_symlink():
+                    subdirectories.append(entry.path)
+            elif _matches(entry.name, relative_path, include):
+                instrumentation.count("files_walked")
+                yield entry.path
+        stack.extend(reversed(subdirectories))
+
+
+def read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        instrumentation.file_read(f)
+        return f.read()
+
+
+def _is_ascii(buffer) -> bool:
+    if isinstance(buffer, bytes):
+        return buffer.isascii()
+    return all(buffer[i:i + MMAP_CHUNK].isascii() for i in range(0, len(buffer), MMAP_CHUNK))
+
+
+def _find(buffer, needles, encoding, errors):
+    if codecs.lookup(encoding).name in ("utf-8", "ascii"):
+        found = {needle for needle in needles if buffer.find(needle.encode(encoding)) != -1}
+        if _is_ascii(buffer):
+            return found
+        if errors == "strict":
+            buffer[:].decode(encoding)  # raises on an invalid file; a valid one searches the same as bytes
+            return found
+    text = buffer[:].decode(encoding, errors)
+    return {needle for needle in needles if needle in text}
+
+
+def find_in_file(path: str, needles: Iterable[str], encoding: str = "utf-8", errors: str = "strict") -> Set[str]:
+    """The needles that occur in the file, with the same result as `needle in open(path, encoding=encoding,
+    errors=errors).read()` for needles without line breaks, mostly without decoding the file.
+
+    The raw bytes are searched for the UTF-8 encoded needles; files of MMAP_THRESHOLD bytes or more
+    are memory-mapped instead of read. A pure ASCII file needs nothing else. Otherwise it is decoded
+    so undecodable bytes behave as in text mode: with errors="strict" they raise UnicodeDecodeError,
+    with errors="ignore" they are dropped and the decoded text is searched. Other encodings are
+    always decoded.
+    """
+    needles = list(needles)
+    with open(path, "rb") as f:
+        instrumentation.file_read(f)
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            return _find(f.read(), needles, encoding, errors)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return _find(buffer, needles, encoding, errors)
+
+
+def _compile_patterns(patterns):
+    """(any, each, implied) for patterns that are all str or all bytes."""
+    bar, lookahead, close = ("|", "(?=(", "))") if not patterns or isinstance(patterns[0], str) else (b"|", b"(?=(", b"))")
+    alternation = bar.join(re.escape(p) for p in sorted(patterns, key=len, reverse=True))
+    # the longest pattern wins at a position, so it also stands for every pattern it starts with
+    known = set(patterns)
+    implied = {p: [p[:end] for end in range(1, len(p) + 1) if p[:end] in known] for p in patterns}
+    return re.compile(alternation), re.compile(lookahead + alternation + close), implied
+
+
+def _search(compiled, data):
+    any_pattern, each_pattern, implied = compiled
+    first = any_pattern.search(data)
+    if not first:
+        return set()
+    found = set()
+    for m in each_pattern.finditer(data, first.start()):
+        found.update(implied[m.group(1)])
+    return found
+
+
+class PatternMatcher:
+    """Finds all occurrences of a fixed set of strings, overlapping ones included, in a single scan per line.
+
+    search_bytes() and search_file() look for the UTF-8 encoded patterns in raw bytes, so files and
+    lines need no decoding; their results are still the str patterns.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(dict.fromkeys(patterns))
+        # an empty alternation would match everywhere: without patterns nothing is compiled or searched
+        self._text = _compile_patterns(self.patterns) if self.patterns else None
+        self._bytes = None  # compiled on first use
+
+    def _compiled(self, data):
+        if isinstance(data, str):
+            return self._text
+        if self._bytes is None:
+            encoded = {p.encode("utf-8"): p for p in self.patterns}
+            any_pattern, each_pattern, implied = _compile_patterns(list(encoded))
+            self._bytes = any_pattern, each_pattern, {b: [encoded[p] for p in ps] for b, ps in implied.items()}
+        return self._bytes
+
+    def search(self, text):
+        """Return the set of patterns found in text (a line or a whole file)."""
+        if not self.patterns:
+            return set()
+        return _search(self._text, text)
+
+    def search_bytes(self, data):
+        """Return the set of patterns found in UTF-8 data (bytes, a memory map, ...)."""
+        if not self.patterns:
+            return set()
+        return _search(self._compiled(data), data)
+
+    def iter_matches(self, data):
+        """Yield (offset, patterns starting there) for every offset of data (str or UTF-8 bytes) where one does.
+
+        Hits are found with the plain alternation, which skips ahead to candidates fast, so a large
+        block with few hits costs about one regex scan.
+        """
+        if not self.patterns:
+            return
+        any_pattern, _, implied = self._compiled(data)
+        match = any_pattern.search(data)
+        while match:
+            yield match.start(), implied[match.group()]
+            match = any_pattern.search(data, match.start() + 1)
+
+    def search_file(self, path, errors="strict"):
+        """The patterns in the UTF-8 file at path, the same as search(open(path, errors=errors).read()).
+
+        Like find_in_file, the raw bytes are searched (memory-mapped from MMAP_THRESHOLD bytes on), and
+        the file is only decoded when it isn't pure ASCII: to raise UnicodeDecodeError on an invalid file
+        with errors="strict", or to search the decoded text with any other errors handler.
+        """
+        if not self.patterns:
+            return set()
+        with open(path, "rb") as f:
+            instrumentation.file_read(f)
+            if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+                return self._search_buffer(f.read(), errors)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return self._search_buffer(buffer, errors)
+
+    def _search_buffer(self, buffer, errors):
+        if _is_ascii(buffer):
+            return self.search_bytes(buffer)
+        if errors == "strict":
+            buffer[:].decode("utf-8")  # raises on an invalid file; a valid one searches the same as bytes
+            return self.search_bytes(buffer)
+        return self.search(buffer[:].decode("utf-8", errors))
+
+    def scan(self, lines):
+        """Yield (line_number, pattern) for every pattern found in lines, line numbers starting at 1."""
+        for line_number, line in enumerate(lines, 1):
+            for pattern in self.search(line):
+                yield line_number, pattern
+
+
+def read_files(paths: Iterable[str], read: Callable[[str], object] = read_text, max_workers: int = READ_WORKERS,
+               stats: ScanStats = None) -> Iterator[Tuple[str, object]]:
+    """Yield (path, read(path)) in input order while up to max_workers reads run ahead in threads.
+
+    A read that fails yields its exception instead of a result.
+    """
+    def guarded(path):
+        try:
+            result = read(path)
+        except Exception as e:
+            return path, e
+        if stats:
+            stats.file_read(len(result) if isinstance(result, (str, bytes)) else 0)
+        return path, result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # bounded read-ahead, so a large tree is never held in memory at once
+        pending = deque()
+        for path in paths:
+            pending.append(executor.submit(guarded, path))
+            if len(pending) >= max_workers * READ_AHEAD:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
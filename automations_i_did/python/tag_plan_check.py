@@ -2,170 +2,842 @@
 Description: Adding automated Terraform plan checker for newly added tags
 """
 import os
+import sys
+import csv
+import json
+import hashlib
 import argparse
+import functools
+from array import array
+from typing import NamedTuple
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 
-# Strings to search for in files
-SEARCH_STRINGS = [
-    "~ size_in_gbs",
-    "~ shape_config",
-    "No changes. Your infrastructure matches the configuration."
-    "~ launch_options"
-    "~ network_type"
-]
-#instances
-INSTANCE_TARGET_LINE = ".oci_core_instance.instance will be updated in-place"
-NO_CHANGES_IN_INSTANCE_LINE = "# (6 unchanged blocks hidden)"
-#block volumes
-TARGET_LINE = ".oci_core_volume.block_volume will be updated in-place"
-EXPECTED_NINTH_LINE = "# (13 unchanged attributes hidden)"
-POLICY_ASSIGNMENT_LINE = "oci_core_volume_backup_policy_assignment.volume_backup_policy_assignment[0] must be replaced"
+import instrumentation
+from repoScanner import PatternMatcher, find_in_file
 
-def find_matching_files(folder):
-    for root, _, files in os.walk(folder):
-        for file_name in files:
-            file_path = os.path.join(root, file_name)
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                    for string in SEARCH_STRINGS:
-                        if string in content:
-                            print(f"🚨 {string} : Match found: {file_path}")
-            except Exception as e:
-                print(f"\u26A0\uFE0F Could not read file {file_path}: {e}")
+try:
+    import ijson  # optional: streams `terraform show -json` output instead of loading it whole
+except ImportError:
+    ijson = None
 
+try:
+    import tomllib  # the rule registry; Python 3.11+
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
 
-def block_volume_plan(folder_path):
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
+# Rule registry read by default; --rules picks another one
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plan_rules.toml")
 
-        if os.path.isfile(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()
-                    target_indices = [i for i, line in enumerate(lines) if TARGET_LINE in line]
+SECTION_SEPARATOR = "***********************"
+PLAN_BLOCK_SIZE = 1 << 20  # bytes of a plan file searched at once
+CACHE_FORMAT = 3  # bump when the engine or a rule kind changes in a way the rule registry doesn't capture
 
-                    if len(target_indices) in [6, 18]:
-                        valid = True
-                        for i in target_indices:
-                            ninth_valid = i + 9 < len(lines) and lines[i + 9].strip() == EXPECTED_NINTH_LINE
-                            seventh_valid = i + 7 < len(lines) and lines[i + 7].strip() == EXPECTED_NINTH_LINE
 
-                            if not ninth_valid and not seventh_valid:
-                                valid = False
-                                break
+def _expected(counts):
+    return f"[{' or '.join(map(str, counts))}]"
 
-                        if not valid:
-                            print(f"⚠️ 9th or 7th line didn't match in BLOCK VOLUME updation - Check: {file_path}")
-            except Exception as e:
-                print(f"\u26A0\uFE0F Could not read file {file_path}: {e}")
 
+#json plans - resource_changes summarised by resource type and action
+class JsonPlanSummary:
+    """Counts of the resource_changes of a JSON plan, keyed by (type, name, action).
 
-def block_volume_plan_inplace(folder_path):
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
+    action is one of create, update, replace, delete, read or no-op.
+    """
 
-        if os.path.isfile(file_path) and "NLB" not in file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()
-                    target_indices = [i for i, line in enumerate(lines) if TARGET_LINE.strip() in line.strip()]
+    def __init__(self):
+        self.actions = Counter()
+        self.update_changes = defaultdict(Counter)  # (type, name) -> {attributes changed by one update: updates}
+        self.changed_attributes = defaultdict(set)  # type -> attributes changed by any update/replace
+        self.totals = Counter()                  # add / change / destroy, as in the "Plan:" line
 
-                    match_count = len(target_indices)
-                    if match_count not in [6, 18]:
-                        print(f"📧 Found {match_count} matches instead of [6 or 18] for BLOCK VOLUME 'will be updated in-place' — Check: {file_path}")
-            except Exception as e:
-                print(f"⚠️ Could not read file {file_path}: {e}")
+    def add(self, resource_change):
+        change = resource_change.get("change", {})
+        actions = change.get("actions", [])
+        if actions == ["update"]:
+            action = "update"
+        elif sorted(actions) == ["create", "delete"]:
+            action = "replace"
+        else:
+            action = actions[0] if len(actions) == 1 else "no-op"
 
-def instance_plan_inplace(folder_path):
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
+        resource = (resource_change.get("type"), resource_change.get("name"))
+        self.actions[resource + (action,)] += 1
+        self.totals["add"] += action in ("create", "replace")
+        self.totals["change"] += action == "update"
+        self.totals["destroy"] += action in ("delete", "replace")
 
-        if os.path.isfile(file_path) and "NLB" not in file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()
-                    target_indices = [i for i, line in enumerate(lines) if INSTANCE_TARGET_LINE.strip() in line.strip()]
+        if action in ("update", "replace"):
+            before = change.get("before") or {}
+            after = change.get("after") or {}
+            unknown = change.get("after_unknown") or {}
+            changed = {k for k in set(before) | set(after) if before.get(k) != after.get(k)}
+            changed.update(k for k, v in unknown.items() if v)
+            self.changed_attributes[resource[0]].update(changed)
+            if action == "update":
+                self.update_changes[resource][frozenset(changed)] += 1
 
-                    match_count = len(target_indices)
-                    if match_count not in [1, 3]:
-                        print(f"🚨 Found {match_count} matches for INSTANCE instead of [1 or 3] 'will be updated in-place' — Check: {file_path}")
-            except Exception as e:
-                print(f"⚠️ Could not read file {file_path}: {e}")
+    def count(self, resource, action):
+        return self.actions[tuple(resource) + (action,)]
 
-def noshapechanges_inplan_valdiation(folder_path):
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
+    def updates_changing_more_than(self, resource, attributes):
+        """Number of updates of resource that change anything besides attributes."""
+        attributes = set(attributes)
+        return sum(updates for changed, updates in self.update_changes[tuple(resource)].items() if changed - attributes)
 
-        if os.path.isfile(file_path) and "NLB" not in file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()
-                    target_indices = [i for i, line in enumerate(lines) if NO_CHANGES_IN_INSTANCE_LINE.strip() in line.strip()]
 
-                    match_count = len(target_indices)
-                    if match_count == 0:
-                        print(f"🚨 Some VM Shape Change is about to happen — Check: {file_path}")
-            except Exception as e:
-                print(f"⚠️ Could not read file {file_path}: {e}")
+def iter_resource_changes(f):
+    """Yield the resource_changes of a JSON plan opened in binary mode, streamed when ijson is installed."""
+    if ijson is not None:
+        yield from ijson.items(f, "resource_changes.item")
+    else:
+        yield from json.load(f).get("resource_changes") or []
 
-def block_volume_plan_policy(folder_path):
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
 
-        if os.path.isfile(file_path) and "NLB" not in file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()
-                    target_indices = [i for i, line in enumerate(lines) if POLICY_ASSIGNMENT_LINE.strip() in line.strip()]
+#rules - the kinds of checks the registry can configure
+class Finding(NamedTuple):
+    count: int          # matches counted by the rule, READ_ERROR when the file could not be read
+    line: int = 0       # line the finding points at, 0 for the whole file
+    detail: str = ""    # e.g. the search string found, or the read error
 
-                    match_count = len(target_indices)
-                    if match_count not in [6, 18]:
-                        print(f"🚨 Found {match_count} matches for backup policy assignment instead of [6 or 18] — Check: {file_path}")
-            except Exception as e:
-                print(f"⚠️ Could not read file {file_path}: {e}")
 
+READ_ERROR = -1
+REQUIRED = object()
+SCOPES = ("top_level", "recursive")
+COMMON_KEYS = {"name", "kind", "title", "scope", "exclude_paths", "message", "read_error_message"}
+DEFAULT_READ_ERROR_MESSAGE = "⚠️ Could not read file {file}: {error}"
 
-def find_plan_output(folder):
-    expected_plans = [
-        "Plan: 6 to add, 7 to change, 6 to destroy.",
-        "Plan: 18 to add, 21 to change, 18 to destroy."
-    ]
 
+class RuleState:
+    """What one rule has seen of one file so far; each kind uses the fields it needs."""
+    __slots__ = ("count", "valid", "invalid_line", "pending", "found")
+
+    def __init__(self):
+        self.count = 0
+        self.valid = True
+        self.invalid_line = 0
+        self.pending = None
+        self.found = None
+
+
+class PlanRule:
+    """One check of the rule registry. Subclasses are the kinds; instances are the configured rules.
+
+    A rule holds no per-file state (that is the RuleState start() returns), so one instance checks
+    every file and can be sent to worker processes. Rules compare equal when their settings do.
+    """
+    kind = None
+    options = {}          # kind-specific settings and their defaults, REQUIRED when they must be set
+    patterns = ()         # strings this rule wants to be told about
+    presence_only = False  # True: only whether a pattern occurs matters; match() gets no line
+
+    def __init__(self, spec):
+        unknown = set(spec) - COMMON_KEYS - set(self.options)
+        if unknown:
+            raise ValueError(f"unknown settings {', '.join(sorted(unknown))}")
+        for key, default in self.options.items():
+            if default is REQUIRED and key not in spec:
+                raise ValueError(f"'{key}' is required for {self.kind} rules")
+            value = spec.get(key, default)
+            setattr(self, key, tuple(value) if isinstance(value, list) else value)
+        self.spec = spec
+        self.name = spec["name"]
+        self.title = spec.get("title", self.name)
+        if spec.get("scope", "top_level") not in SCOPES:
+            raise ValueError(f"scope must be one of {', '.join(SCOPES)}")
+        self.recursive = spec.get("scope") == "recursive"
+        self.exclude_paths = tuple(spec.get("exclude_paths", ()))
+        self.message_template = spec["message"]
+        self.read_error_template = spec.get("read_error_message", DEFAULT_READ_ERROR_MESSAGE)
+        try:
+            self.message("", Finding(0))
+            self.read_error_message("", "")
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"bad message template: {e!r}")
+        self._key = (type(self), json.dumps(spec, sort_keys=True))
+
+    def __eq__(self, other):
+        return isinstance(other, PlanRule) and self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
+
+    def applies_to(self, file_path, top_level, is_file):
+        if any(excluded in file_path for excluded in self.exclude_paths):
+            return False
+        return self.recursive or (top_level and is_file)
+
+    def start(self):
+        return RuleState()
+
+    def match(self, state, line_number, pattern, line):
+        state.count += 1
+
+    def finish(self, state):
+        """Return the Findings for a file once all of its lines have been scanned."""
+        raise NotImplementedError
+
+    def check_json(self, summary):
+        """Return the Findings for a JSON plan from its JsonPlanSummary."""
+        return []
+
+    def message(self, file_path, finding):
+        """The report line for one of this rule's findings."""
+        allowed = getattr(self, "allowed", None) or getattr(self, "when_count_in", None) or ()
+        return self.message_template.format(file=file_path, count=finding.count, line=finding.line,
+                                            detail=finding.detail, expected=_expected(allowed))
+
+    def read_error(self, e):
+        return Finding(READ_ERROR, 0, str(e))
+
+    def read_error_message(self, file_path, error):
+        return self.read_error_template.format(file=file_path, error=error)
+
+
+class ContainsRule(PlanRule):
+    kind = "contains"
+    options = {"patterns": REQUIRED}
+    presence_only = True
+
+    def start(self):
+        state = RuleState()
+        state.found = {}  # pattern -> first line it was found on, 0 when not known
+        return state
+
+    def match(self, state, line_number, pattern, line):
+        state.found.setdefault(pattern, line_number or 0)
+
+    def finish(self, state):
+        return [Finding(1, state.found[pattern], pattern) for pattern in self.patterns if pattern in state.found]
+
+    def check_json(self, summary):
+        # "~ attribute" in the text plan is an attribute changed by an update or replacement
+        changed = set().union(*summary.changed_attributes.values())
+        state = self.start()
+        state.found = {pattern: 0 for pattern in self.patterns if pattern.startswith("~ ") and pattern[2:] in changed}
+        return self.finish(state)
+
+
+class CountRule(PlanRule):
+    kind = "count"
+    options = {"patterns": REQUIRED, "allowed": (), "minimum": 0, "json_resource": None, "json_action": "update"}
+
+    def finish(self, state):
+        if (self.allowed and state.count not in self.allowed) or state.count < self.minimum:
+            return [Finding(state.count)]
+        return []
+
+    def check_json(self, summary):
+        if self.json_resource is None:
+            return []
+        state = self.start()
+        state.count = summary.count(self.json_resource, self.json_action)
+        return self.finish(state)
+
+
+class LookaheadRule(PlanRule):
+    """Every target line must be followed by the expect line exactly one of offsets lines later.
+
+    Only targets still inside the lookahead window are remembered, so memory does not grow with the file.
+    """
+    kind = "lookahead"
+    options = {"target": REQUIRED, "expect": REQUIRED, "offsets": REQUIRED, "when_count_in": (),
+               "json_resource": None, "json_only_attributes": ()}
+
+    @property
+    def patterns(self):
+        return (self.target, self.expect)
+
+    def start(self):
+        state = RuleState()
+        state.pending = deque()  # target line numbers still waiting for their expect line
+        return state
+
+    def _expire(self, state, line_number):
+        window = max(self.offsets)
+        while state.pending and state.pending[0] + window < line_number:
+            target = state.pending.popleft()
+            if state.valid:
+                state.valid, state.invalid_line = False, target
+
+    def match(self, state, line_number, pattern, line):
+        self._expire(state, line_number)
+        if pattern == self.target:
+            state.count += 1
+            state.pending.append(line_number)
+        elif line.strip() == self.expect:
+            for offset in self.offsets:
+                if line_number - offset in state.pending:
+                    state.pending.remove(line_number - offset)
+
+    def finish(self, state):
+        if self.when_count_in and state.count not in self.when_count_in:
+            return []
+        if not state.valid or state.pending:
+            return [Finding(state.count, state.invalid_line if not state.valid else state.pending[0])]
+        return []
+
+    def check_json(self, summary):
+        # the hidden-attributes line means the update changed nothing but json_only_attributes
+        if self.json_resource is None:
+            return []
+        state = self.start()
+        state.count = summary.count(self.json_resource, "update")
+        state.valid = not summary.updates_changing_more_than(self.json_resource, self.json_only_attributes)
+        return self.finish(state)
+
+
+class PlanSummaryRule(PlanRule):
+    kind = "plan_summary"
+    options = {"patterns": REQUIRED}
+
+    def finish(self, state):
+        return [] if state.count else [Finding(0)]
+
+    def check_json(self, summary):
+        state = self.start()
+        totals = summary.totals
+        state.count = f"Plan: {totals['add']} to add, {totals['change']} to change, {totals['destroy']} to destroy." in self.patterns
+        return self.finish(state)
+
+
+class UnchangedRule(PlanRule):
+    kind = "unchanged"
+    options = {"patterns": REQUIRED, "json_resource_type": None, "json_attributes": ()}
+
+    def finish(self, state):
+        return [] if state.count else [Finding(0)]
+
+    def check_json(self, summary):
+        # the marker line is missing from the text plan when one of json_attributes changes
+        if self.json_resource_type is None:
+            return []
+        state = self.start()
+        state.count = 0 if summary.changed_attributes[self.json_resource_type] & set(self.json_attributes) else 1
+        return self.finish(state)
+
+
+RULE_KINDS = {rule_kind.kind: rule_kind for rule_kind in (ContainsRule, CountRule, LookaheadRule, PlanSummaryRule, UnchangedRule)}
+
+
+def load_rules(path=DEFAULT_RULES_FILE):
+    """Read a rule registry; returns its rules in file order, which is also the report order."""
+    if tomllib is None:
+        raise RuntimeError("Reading the rule registry needs Python 3.11+ or the tomli package")
+    with open(path, 'rb') as f:
+        try:
+            data = tomllib.load(f)
+        except tomllib.TOMLDecodeError as e:
+            raise ValueError(f"{path}: {e}") from None
+    rules, names = [], set()
+    for position, spec in enumerate(data.get("rule", []), 1):
+        name = spec.get("name")
+        try:
+            if not isinstance(name, str) or not name:
+                raise ValueError("every rule needs a name")
+            if name in names:
+                raise ValueError("the name is used twice")
+            if spec.get("kind") not in RULE_KINDS:
+                raise ValueError(f"kind must be one of {', '.join(RULE_KINDS)}")
+            if "message" not in spec:
+                raise ValueError("every rule needs a message")
+            rules.append(RULE_KINDS[spec["kind"]](spec))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{path}: rule {name or position}: {e}") from None
+        names.add(name)
+    if not rules:
+        raise ValueError(f"{path}: no [[rule]] entries")
+    return tuple(rules)
+
+
+@functools.lru_cache(maxsize=None)
+def default_rules():
+    """The rules of plan_rules.toml, in the order their report sections are printed.
+
+    Read on first use rather than at import, so a broken default registry only fails the
+    callers that need it, not a run with --rules.
+    """
+    return load_rules()
+
+
+def rule_by_name(name, rules=None):
+    rules = default_rules() if rules is None else rules
+    for rule in rules:
+        if rule.name == name:
+            return rule
+    raise KeyError(f"No plan rule named {name}")
+
+
+#engine
+def iter_plan_files(folder, rules):
+    """Yield (file_path, applicable rules) for every plan file at least one rule wants to see."""
     for root, _, files in os.walk(folder):
+        top_level = root == folder
         for file_name in files:
             file_path = os.path.join(root, file_name)
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                    if not any(plan in content for plan in expected_plans):
-                            print(f"🚨 Mandatory TF Plan Output(6,7,6) or (18,21,18) not found in {file_path}")
-            except Exception as e:
-                print(f"Could not read file: {file_path} - {e}")
+            is_file = top_level and os.path.isfile(file_path)
+            applicable = tuple(rule for rule in rules if rule.applies_to(file_path, top_level, is_file))
+            if applicable:
+                yield file_path, applicable
+
+
+class RulePlan(NamedTuple):
+    """The compiled form of a rule set: one matcher for all of its patterns."""
+    matcher: PatternMatcher
+    dispatch: dict          # pattern -> indexes of the rules that want it
+    presence_only: bool     # no rule needs lines, so files can be searched without decoding them
+
+
+@functools.lru_cache(maxsize=None)
+def compile_rules(rules):
+    """Compile rules into one RulePlan; a rule set is compiled once however many files it checks."""
+    matcher = PatternMatcher(p for rule in rules for p in rule.patterns)
+    dispatch = {p: [i for i, rule in enumerate(rules) if p in rule.patterns] for p in matcher.patterns}
+    return RulePlan(matcher, dispatch, all(rule.presence_only for rule in rules))
+
+
+def iter_line_blocks(f, size=PLAN_BLOCK_SIZE):
+    """Read the binary file f in blocks of about size bytes that end at a line break (the last one
+    at the end of the file); a line is never split between blocks."""
+    rest = b""
+    while True:
+        block = f.read(size)
+        if not block:
+            if rest:
+                yield rest
+            return
+        block = rest + block
+        cut = block.rfind(b"\n") + 1
+        if cut == 0:
+            rest = block
+            continue
+        rest = block[cut:]
+        yield block[:cut]
+
+
+def iter_hit_lines(matcher, f, size=PLAN_BLOCK_SIZE):
+    """Yield (line_number, line, patterns) for every line of the binary file f containing a pattern.
+
+    Whole blocks are searched at once, on their raw bytes when they are ASCII; lines are only found,
+    counted and decoded around the hits. A block with other bytes is decoded dropping undecodable
+    ones first, as reading the file in text mode with errors='ignore' would.
+    """
+    first_line = 1
+    for block in iter_line_blocks(f, size):
+        if not block.isascii():
+            block = block.decode('utf-8', errors='ignore')
+        newline = "\n" if isinstance(block, str) else b"\n"
+        line_number, counted_to, line_end, found = first_line, 0, -1, None
+        for offset, patterns in matcher.iter_matches(block):
+            if offset > line_end:
+                if found:
+                    yield line_number, line, found
+                line_number += block.count(newline, counted_to, offset)
+                counted_to = offset
+                line_start = block.rfind(newline, 0, offset) + 1
+                line_end = block.find(newline, offset)
+                line_end = len(block) if line_end == -1 else line_end
+                line = block[line_start:line_end + 1]
+                line = line if isinstance(line, str) else line.decode('ascii')
+                found = set()
+            found.update(patterns)
+        if found:
+            yield line_number, line, found
+        first_line += block.count(newline)
+
+
+@instrumentation.timed()
+def check_plan_file(file_path, rules):
+    """Stream file_path once, handing every pattern hit to the rules that registered it.
+
+    The file is searched in blocks of lines with one regex over all patterns, however many rules
+    there are; only lines with a hit are decoded and passed on. Only the current block and each
+    rule's small state are held, so memory stays flat for any plan size.
+    Returns one list of Findings per rule.
+    """
+    plan = compile_rules(rules)
+    states = [rule.start() for rule in rules]
+    instrumentation.count("rules_evaluated", len(rules))
+    hits = 0
+    if plan.presence_only:
+        # nothing needs lines: search the raw bytes of the file instead of decoding it
+        try:
+            for pattern in find_in_file(file_path, plan.matcher.patterns, errors='ignore'):
+                hits += 1
+                for i in plan.dispatch[pattern]:
+                    rules[i].match(states[i], None, pattern, None)
+        except Exception as e:
+            return [[rule.read_error(e)] for rule in rules]
+        instrumentation.count("matches_found", hits, kind="plan_pattern")
+        return [rule.finish(state) for rule, state in zip(rules, states)]
+    try:
+        with open(file_path, 'rb') as f:
+            instrumentation.file_read(f)
+            for line_number, line, found in iter_hit_lines(plan.matcher, f):
+                for pattern in found:
+                    hits += 1
+                    for i in plan.dispatch[pattern]:
+                        rules[i].match(states[i], line_number, pattern, line)
+    except Exception as e:
+        return [[rule.read_error(e)] for rule in rules]
+    instrumentation.count("matches_found", hits, kind="plan_pattern")
+    return [rule.finish(state) for rule, state in zip(rules, states)]
+
+
+@instrumentation.timed()
+def check_json_plan_file(file_path, rules):
+    """Summarise the JSON plan in file_path once and evaluate every rule on the summary.
+
+    Returns one list of Findings per rule, like check_plan_file.
+    """
+    summary = JsonPlanSummary()
+    instrumentation.count("rules_evaluated", len(rules))
+    try:
+        with open(file_path, 'rb') as f:
+            instrumentation.file_read(f)
+            for resource_change in iter_resource_changes(f):
+                summary.add(resource_change)
+    except Exception as e:
+        return [[rule.read_error(e)] for rule in rules]
+    return [rule.check_json(summary) for rule in rules]
+
+
+#cache - findings of unchanged plan files are reused between runs
+def ruleset_version(rules, json_plans=False):
+    """Hash of everything the findings depend on besides the file itself: every setting of every rule."""
+    spec = [CACHE_FORMAT, json_plans, [rule.spec for rule in rules]]
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        instrumentation.file_read(f)
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PlanCheckCache:
+    """Findings per plan file on disk, keyed by path, size, mtime and content hash.
+
+    The whole cache is dropped when the rule-set version it was written with differs, and save()
+    keeps only the files looked up in this run, so deleted files and other plan folders drop out.
+    """
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._fingerprints = {}
+        self._used = set()  # files looked up or stored in this run
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == version:
+                self.entries = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    def get(self, file_path, rules):
+        """Return the cached findings per rule, or None when file_path has to be checked."""
+        self._used.add(file_path)
+        try:
+            stat = os.stat(file_path)
+            entry = self.entries.get(file_path)
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                sha256 = entry["sha256"]
+            else:
+                sha256 = file_sha256(file_path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        if entry and entry["size"] == stat.st_size and entry["sha256"] == sha256:
+            if all(rule.name in entry["findings"] for rule in rules):
+                entry["mtime_ns"] = stat.st_mtime_ns
+                self.hits += 1
+                return [entry["findings"][rule.name] for rule in rules]
+
+        self._fingerprints[file_path] = (stat.st_size, stat.st_mtime_ns, sha256)
+        self.misses += 1
+        return None
+
+    def put(self, file_path, rules, results):
+        fingerprint = self._fingerprints.pop(file_path, None)
+        if fingerprint is None:
+            return
+        size, mtime_ns, sha256 = fingerprint
+        self._used.add(file_path)
+        self.entries[file_path] = {
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "sha256": sha256,
+            "findings": {rule.name: findings for rule, findings in zip(rules, results)},
+        }
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.version,
+                       "files": {file_path: entry for file_path, entry in self.entries.items() if file_path in self._used}}, f)
+        os.replace(tmp_path, self.path)
+
+
+#report - findings are collected in columns and only turned into text when they are written out
+class PlanFindings:
+    """All findings of a run as parallel arrays of file id, rule id, count, line and detail id.
+
+    File paths and details are stored once and referred to by id, so a finding takes 18 bytes
+    however long its path or message. Messages are built by the rules when the report is written.
+    """
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self.files = []
+        self.details = [""]
+        self._file_ids = {}
+        self._detail_ids = {"": 0}
+        self.file_ids = array('I')
+        self.rule_ids = array('H')
+        self.counts = array('i')
+        self.lines = array('I')
+        self.detail_ids = array('I')
+
+    def __len__(self):
+        return len(self.file_ids)
+
+    @staticmethod
+    def _intern(value, values, ids):
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(values)
+            values.append(value)
+        return index
+
+    def add(self, file_path, rule_id, count, line=0, detail=""):
+        self.file_ids.append(self._intern(file_path, self.files, self._file_ids))
+        self.rule_ids.append(rule_id)
+        self.counts.append(count)
+        self.lines.append(line)
+        self.detail_ids.append(self._intern(detail, self.details, self._detail_ids))
+
+    def finding(self, i):
+        return Finding(self.counts[i], self.lines[i], self.details[self.detail_ids[i]])
+
+    def message(self, i):
+        rule, file_path, finding = self.rules[self.rule_ids[i]], self.files[self.file_ids[i]], self.finding(i)
+        if finding.count == READ_ERROR:
+            return rule.read_error_message(file_path, finding.detail)
+        return rule.message(file_path, finding)
+
+    def order(self, by="rule"):
+        """Finding indexes sorted by rule (then walk order, as the text report lists them) or by file path."""
+        if by == "file":
+            return sorted(range(len(self)), key=lambda i: (self.files[self.file_ids[i]], self.rule_ids[i]))
+        return sorted(range(len(self)), key=self.rule_ids.__getitem__)
+
+    def messages(self, rule):
+        rule_id = self.rules.index(rule)
+        return [self.message(i) for i in range(len(self)) if self.rule_ids[i] == rule_id]
+
+    def counts_by_rule(self):
+        totals = Counter(self.rule_ids)
+        return {rule: totals[rule_id] for rule_id, rule in enumerate(self.rules)}
+
+    def rows(self, by="file"):
+        """Yield one dict per finding, for CSV and JSON export."""
+        for i in self.order(by):
+            rule, finding = self.rules[self.rule_ids[i]], self.finding(i)
+            error = finding.count == READ_ERROR
+            yield {
+                "file": self.files[self.file_ids[i]],
+                "rule": rule.name,
+                "check": rule.title,
+                "count": None if error else finding.count,
+                "line": finding.line or None,
+                "detail": finding.detail or None,
+                "error": error,
+                "message": self.message(i),
+            }
+
+    def write_text(self, out):
+        """The classic report: every rule's section in rule order, even when it is empty."""
+        lines = []
+        position = 0
+        order = self.order("rule")
+        for rule_id in range(len(self.rules)):
+            lines += [SECTION_SEPARATOR, SECTION_SEPARATOR]
+            while position < len(order) and self.rule_ids[order[position]] == rule_id:
+                lines.append(self.message(order[position]))
+                position += 1
+        out.write("\n".join(lines) + "\n")
+
+    def write_table(self, out):
+        order = self.order("file")
+        width = max([len("file")] + [len(self.files[self.file_ids[i]]) for i in order])
+        check_width = max(len(rule.title) for rule in self.rules)
+        lines = [f"{'file':<{width}}  {'check':<{check_width}}  {'count':>5}  {'line':>6}  detail"]
+        for i in order:
+            finding = self.finding(i)
+            count = "error" if finding.count == READ_ERROR else finding.count
+            lines.append(f"{self.files[self.file_ids[i]]:<{width}}  {self.rules[self.rule_ids[i]].title:<{check_width}}  "
+                         f"{count:>5}  {finding.line or '':>6}  {finding.detail}".rstrip())
+        totals = self.counts_by_rule()
+        lines.append(f"{len(self)} findings in {len(self.files)} files: "
+                     + ", ".join(f"{rule.title} {count}" for rule, count in totals.items() if count))
+        out.write("\n".join(lines) + "\n")
+
+    def write_csv(self, out):
+        writer = csv.DictWriter(out, fieldnames=FINDING_FIELDS)
+        writer.writeheader()
+        writer.writerows(self.rows())
+
+    def write_json(self, out):
+        json.dump({
+            "files": len(self.files),
+            "summary": {rule.name: count for rule, count in self.counts_by_rule().items()},
+            "findings": list(self.rows()),
+        }, out, indent=2, ensure_ascii=False)
+        out.write("\n")
+
+
+FINDING_FIELDS = ["file", "rule", "check", "count", "line", "detail", "error", "message"]
+REPORT_FORMATS = {
+    "text": PlanFindings.write_text,
+    "table": PlanFindings.write_table,
+    "csv": PlanFindings.write_csv,
+    "json": PlanFindings.write_json,
+}
+
+
+@instrumentation.timed()
+def run_plan_checks(folder, rules=None, workers=1, json_plans=False, cache=None):
+    """Check every plan file under folder in a single pass. Returns the PlanFindings, in walk order.
+
+    rules defaults to the default registry, default_rules().
+    With workers > 1 the files are spread over a process pool; results are merged back in
+    walk order, so the findings are identical to a serial run. With json_plans the files are
+    read as `terraform show -json` output instead of plan text. With a PlanCheckCache only
+    new or changed files are checked, the others report their cached findings.
+    """
+    rules = default_rules() if rules is None else rules
+    check = check_json_plan_file if json_plans else check_plan_file
+    plan_files = list(iter_plan_files(folder, rules))
+    cached = [cache.get(file_path, file_rules) if cache else None for file_path, file_rules in plan_files]
+    to_check = [plan_file for plan_file, hit in zip(plan_files, cached) if hit is None]
+    paths = [file_path for file_path, _ in to_check]
+    applicable = [file_rules for _, file_rules in to_check]
+
+    if workers > 1 and len(to_check) > 1 and instrumentation.enabled():
+        # each worker records into its own process and sends its metrics back with every result
+        chunksize = max(1, len(to_check) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=instrumentation.enable,
+                                 initargs=(instrumentation.tracing(), True)) as executor:
+            results = []
+            for file_findings, metrics in executor.map(functools.partial(instrumentation.call_and_drain, check),
+                                                       paths, applicable, chunksize=chunksize):
+                instrumentation.merge(metrics)
+                results.append(file_findings)
+    elif workers > 1 and len(to_check) > 1:
+        chunksize = max(1, len(to_check) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(check, paths, applicable, chunksize=chunksize))
+    else:
+        results = map(check, paths, applicable)
+    results = iter(results)
+
+    findings = PlanFindings(rules)
+    rule_ids = {rule: rule_id for rule_id, rule in enumerate(rules)}
+    for (file_path, file_rules), file_findings in zip(plan_files, cached):
+        if file_findings is None:
+            file_findings = next(results)
+            if cache:
+                cache.put(file_path, file_rules, file_findings)
+        for rule, rule_findings in zip(file_rules, file_findings):
+            for finding in rule_findings:
+                findings.add(file_path, rule_ids[rule], *finding)
+    instrumentation.count("plan_files_checked", len(to_check))
+    instrumentation.count("plan_files_cached", len(plan_files) - len(to_check))
+    for rule, count in findings.counts_by_rule().items():
+        instrumentation.count("findings", count, rule=rule.name)
+    return findings
+
+
+@instrumentation.timed()
+def print_findings(findings, report_format="text", out=None):
+    REPORT_FORMATS[report_format](findings, out or sys.stdout)
+
+
+def _print_rule(folder, name):
+    rule = rule_by_name(name)
+    for message in run_plan_checks(folder, (rule,)).messages(rule):
+        print(message)
+
+
+#individual checks of the default registry, kept for callers that only want one of them
+def find_matching_files(folder):
+    _print_rule(folder, "search_strings")
+
+
+def block_volume_plan(folder_path):
+    _print_rule(folder_path, "block_volume_lookahead")
+
+
+def block_volume_plan_inplace(folder_path):
+    _print_rule(folder_path, "block_volume_in_place")
+
+
+def instance_plan_inplace(folder_path):
+    _print_rule(folder_path, "instance_in_place")
+
+
+def noshapechanges_inplan_valdiation(folder_path):
+    _print_rule(folder_path, "no_shape_changes")
+
+
+def block_volume_plan_policy(folder_path):
+    _print_rule(folder_path, "block_volume_policy")
+
+
+def find_plan_output(folder):
+    _print_rule(folder, "plan_output")
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Validate Terraform Plan Files")
     parser.add_argument('--path', '-p', required=True, help='Path to directory containing Terraform plan files')
+    parser.add_argument('--workers', '-w', type=int, default=1, help='Number of worker processes to check plan files with (default: 1, serial)')
+    parser.add_argument('--json', '-j', action='store_true', help='Plan files are `terraform show -json` output instead of plan text')
+    parser.add_argument('--cache', '-c', help='Cache file to reuse the findings of unchanged plan files between runs')
+    parser.add_argument('--format', '-f', choices=REPORT_FORMATS, default='text', help='text: one section per check (default); table: one table sorted by file; csv or json for dashboards')
+    parser.add_argument('--output', '-o', help='Write the report to this file instead of stdout')
+    parser.add_argument('--rules', '-r', default=DEFAULT_RULES_FILE, help='TOML rule registry to check the plans with (default: plan_rules.toml next to this script)')
+    instrumentation.add_arguments(parser)
     args = parser.parse_args()
+    instrumentation.configure(args)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        rules = load_rules(args.rules)
+    except (OSError, ValueError, RuntimeError) as e:
+        parser.error(f"Could not load the rules: {e}")
 
-    print("***********************")
-    print("***********************")
-    find_matching_files(args.path)
-    print("***********************")
-    print("***********************")
-    block_volume_plan(args.path)
-    print("***********************")
-    print("***********************")
-    block_volume_plan_inplace(args.path)
-    print("***********************")
-    print("***********************")
-    block_volume_plan_policy(args.path)
-    print("***********************")
-    print("***********************")
-    instance_plan_inplace(args.path)
-    print("***********************")
-    print("***********************")
-    find_plan_output(args.path)
-    print("***********************")
-    print("***********************")
-    noshapechanges_inplan_valdiation(args.path)
+    cache = PlanCheckCache(args.cache, ruleset_version(rules, args.json)) if args.cache else None
+    findings = run_plan_checks(args.path, rules, workers=args.workers, json_plans=args.json, cache=cache)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='' if args.format == 'csv' else None) as out:
+            print_findings(findings, args.format, out)
+    else:
+        print_findings(findings, args.format)
+    if cache:
+        cache.save()
+        print(f"♻️ Plan check cache: {cache.hits} reused, {cache.misses} checked", file=sys.stderr)
@@ -0,0 +1,136 @@
+import asyncio
+
+from bgdOrchestrator import DONE, FAILED, SKIPPED, VERIFIED, BgdOrchestrator, FakeRdsBackend
+
+REGION = "us-east-1"
+FAST_POLLS = {status: (0.01, 0.02) for status in ("PROVISIONING", "AVAILABLE", "SWITCHOVER_IN_PROGRESS")}
+
+
+def orchestrator(backend, **kwargs):
+    return BgdOrchestrator(backend, "15.4", "13.12", poll_intervals=FAST_POLLS, status_batch_window=0.001, **kwargs)
+
+
+def entries(*names):
+    return [{"region_name": REGION, "db_cluster_identifier": name} for name in names]
+
+
+def test_every_cluster_runs_to_done_or_skipped():
+    backend = FakeRdsBackend({(REGION, "a"): "14.9", (REGION, "b"): "13.12", (REGION, "old"): "12.1"},
+                             provision_time=0.05, switchover_time=0.02)
+    records = asyncio.run(orchestrator(backend).run(entries("a", "b", "old", "missing")))
+
+    assert {name: record["state"] for name, record in records.items()} == \
+        {"a": DONE, "b": DONE, "old": SKIPPED, "missing": FAILED}
+    assert records["a"]["bgd_deployment_status"] == "SWITCHOVER_COMPLETED"
+    assert backend.calls["create_blue_green_deployment"] == 2
+    assert backend.calls["switchover_blue_green_deployment"] == 2
+
+
+def test_green_cluster_on_another_engine_version_is_not_switched_over():
+    backend = FakeRdsBackend({(REGION, "a"): "14.9"}, provision_time=0.01, green_engine_version="15.2")
+    records = asyncio.run(orchestrator(backend).run(entries("a")))
+
+    assert records["a"]["state"] == FAILED
+    assert records["a"]["bgd_deployment_status"] == "DIFFERENT ENGINE VERSION IN GREEN"
+    assert "switchover_blue_green_deployment" not in backend.calls
+
+
+class FlakyEngineVersionBackend(FakeRdsBackend):
+    """get_engine_version fails (returns None, as the boto3 backend does on an API error) the first time."""
+
+    failures = 1
+
+    async def get_engine_version(self, region_name, cluster_arn):
+        if self.failures:
+            self.failures -= 1
+            self._call("describe_db_clusters")
+            return None
+        return await super().get_engine_version(region_name, cluster_arn)
+
+
+def test_engine_version_lookup_is_retried_after_a_failure():
+    backend = FlakyEngineVersionBackend({(REGION, "a"): "14.9"}, provision_time=0.01, switchover_time=0.01)
+    records = asyncio.run(orchestrator(backend).run(entries("a")))
+
+    assert records["a"]["state"] == DONE
+
+
+class TimedCreateBackend(FakeRdsBackend):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = {}
+
+    async def create_bgd(self, region_name, config):
+        self.created_at[config["BlueGreenDeploymentName"]] = asyncio.get_running_loop().time()
+        return await super().create_bgd(region_name, config)
+
+
+def test_slow_switchover_does_not_block_creates_in_its_region():
+    backend = TimedCreateBackend({(REGION, "fast"): "14.9"}, provision_time=0.01, switchover_time=1.0)
+    arn = f"arn:aws:rds:{REGION}:{backend.account}:cluster:slow"
+    # a cluster resumed right before its switchover; it holds the region's only switchover slot for a second
+    backend.bgds["bgd-slow"] = {"name": "slow-bgd", "region_name": REGION, "available_at": 0, "switched_at": None,
+                                "target": f"{arn}-green", "engine_version": "15.4"}
+    resumed = {"slow": {"region_name": REGION, "db_cluster_identifier": "slow", "db_cluster_arn": arn,
+                        "engine_version": "14.9", "state": VERIFIED, "bgd_deployment_id": "bgd-slow",
+                        "bgd_deployment_status": "AVAILABLE"}}
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        records = await orchestrator(backend, region_limit=1, account_limit=1).run(entries("slow", "fast"), resumed)
+        return records, backend.created_at["fast-bgd"] - started
+
+    records, create_delay = asyncio.run(run())
+
+    assert records["slow"]["state"] == DONE and records["fast"]["state"] == DONE
+    assert create_delay < 0.5
+
+
+class FlakyDescribeBackend(FakeRdsBackend):
+    """The second describe_bgds fails like a dropped connection."""
+
+    async def describe_bgds(self, region_name, bgd_deployment_ids):
+        if self.calls.get("describe_blue_green_deployments") == 1:
+            self._call("describe_blue_green_deployments")
+            raise ConnectionError("Could not connect to the endpoint URL")
+        return await super().describe_bgds(region_name, bgd_deployment_ids)
+
+
+def test_failed_status_describe_is_polled_again():
+    backend = FlakyDescribeBackend({(REGION, "a"): "14.9", (REGION, "b"): "14.9"}, provision_time=0.05, switchover_time=0.01)
+    records = asyncio.run(orchestrator(backend).run(entries("a", "b")))
+
+    assert {name: record["state"] for name, record in records.items()} == {"a": DONE, "b": DONE}
+
+
+def test_wait_for_a_bgd_times_out():
+    backend = FakeRdsBackend({(REGION, "a"): "14.9"}, provision_time=60)
+    records = asyncio.run(orchestrator(backend, wait_timeout=0.05).run(entries("a")))
+
+    assert records["a"]["state"] == FAILED
+    assert records["a"]["error"].startswith("BGD still PROVISIONING")
+
+
+def resumed_bgd(backend, name, **record):
+    arn = f"arn:aws:rds:{REGION}:{backend.account}:cluster:{name}"
+    backend.bgds[f"bgd-{name}"] = {"name": f"{name}-bgd", "region_name": REGION, "available_at": 0, "switched_at": None,
+                                   "target": f"{arn}-green", "engine_version": "15.4"}
+    return dict(record, region_name=REGION, db_cluster_identifier=name, db_cluster_arn=arn, bgd_deployment_id=f"bgd-{name}")
+
+
+def test_resumed_failed_and_stateless_records_continue_from_their_bgd():
+    backend = FakeRdsBackend({(REGION, name): "14.9" for name in ("failed", "stateless", "done")}, switchover_time=0.01)
+    resumed = {
+        "failed": resumed_bgd(backend, "failed", state=FAILED, bgd_deployment_status="PROVISIONING", error="boom"),
+        # journaled by triggerAwsBlueGreenDeployment: no state, switchover already triggered
+        "stateless": resumed_bgd(backend, "stateless", bgd_deployment_status="AVAILABLE", switchover_triggered=True),
+        "done": resumed_bgd(backend, "done", state=DONE, bgd_deployment_status="SWITCHOVER_COMPLETED"),
+    }
+    backend.bgds["bgd-stateless"]["switched_at"] = 0
+
+    records = asyncio.run(orchestrator(backend).run(entries("failed", "stateless", "done"), resumed))
+
+    assert {name: record["state"] for name, record in records.items()} == {"failed": DONE, "stateless": DONE, "done": DONE}
+    assert "error" not in records["failed"]
+    assert "create_blue_green_deployment" not in backend.calls
+    assert backend.calls["switchover_blue_green_deployment"] == 1
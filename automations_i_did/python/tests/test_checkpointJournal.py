@@ -0,0 +1,52 @@
+import os
+
+from triggerAwsBlueGreenDeployment import CheckpointJournal
+
+
+def write_run(path, resume, **changes):
+    journal = CheckpointJournal(path, resume=resume)
+    journal.record("c1", **changes)
+    journal.close()
+
+
+def test_replay_folds_records_per_cluster(tmp_path):
+    path = str(tmp_path / "deployments.jsonl")
+    journal = CheckpointJournal(path)
+    journal.record("c1", region_name="us-east-1", bgd_deployment_id="bgd-1", bgd_deployment_status="PROVISIONING")
+    journal.record("c2", error="boom")
+    journal.record("c1", bgd_deployment_status="AVAILABLE")
+    journal.close()
+
+    assert CheckpointJournal.replay(path) == {
+        "c1": {"region_name": "us-east-1", "bgd_deployment_id": "bgd-1", "bgd_deployment_status": "AVAILABLE"},
+        "c2": {"error": "boom"},
+    }
+
+
+def test_fresh_run_moves_the_old_journal_aside(tmp_path):
+    path = str(tmp_path / "deployments.jsonl")
+    write_run(path, False, bgd_deployment_id="bgd-old", bgd_deployment_status="SWITCHOVER_COMPLETED")
+    write_run(path, False, bgd_deployment_status="PROVISIONING")
+
+    assert CheckpointJournal.replay(path) == {"c1": {"bgd_deployment_status": "PROVISIONING"}}
+    rotated = [name for name in os.listdir(tmp_path) if name != "deployments.jsonl"]
+    assert len(rotated) == 1
+    assert CheckpointJournal.replay(str(tmp_path / rotated[0]))["c1"]["bgd_deployment_id"] == "bgd-old"
+
+
+def test_resumed_run_appends_to_the_journal(tmp_path):
+    path = str(tmp_path / "deployments.jsonl")
+    write_run(path, False, bgd_deployment_id="bgd-1", bgd_deployment_status="PROVISIONING")
+    write_run(path, True, bgd_deployment_status="AVAILABLE")
+
+    assert CheckpointJournal.replay(path) == {"c1": {"bgd_deployment_id": "bgd-1", "bgd_deployment_status": "AVAILABLE"}}
+    assert os.listdir(tmp_path) == ["deployments.jsonl"]
+
+
+def test_torn_last_record_is_ignored(tmp_path):
+    path = str(tmp_path / "deployments.jsonl")
+    write_run(path, False, bgd_deployment_status="AVAILABLE")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"cluster_id": "c1", "bgd_dep')
+
+    assert CheckpointJournal.replay(path) == {"c1": {"bgd_deployment_status": "AVAILABLE"}}
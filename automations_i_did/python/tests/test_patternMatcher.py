@@ -0,0 +1,60 @@
+import io
+
+import pytest
+
+from repoScanner import PatternMatcher
+from tag_plan_check import iter_hit_lines, iter_line_blocks
+
+PATTERNS = ["dcprod018a", "dcprod018ax", "018a", "owner"]
+TEXT = ('servers = {\n  "dcprod018ax" = {\n    owner = "ops"\n  }\n}\n'
+        'hostname = "dcprod018a" # ünïcode\n\nlast line without a break owner')
+
+
+def test_search_file_matches_search_of_the_decoded_file(tmp_path):
+    matcher = PatternMatcher(PATTERNS)
+    for name, text in (("ascii.tfvars", TEXT.replace("ünïcode", "unicode")), ("utf8.tfvars", TEXT)):
+        path = tmp_path / name
+        path.write_text(text, encoding="utf-8")
+        assert matcher.search_file(str(path)) == matcher.search(text) == set(PATTERNS)
+
+
+def test_search_file_rejects_invalid_utf8_unless_told_otherwise(tmp_path):
+    path = tmp_path / "latin1.tfvars"
+    path.write_bytes('hostname = "dcprod018a" # ünïcode\n'.encode("latin-1"))
+    matcher = PatternMatcher(PATTERNS)
+
+    with pytest.raises(UnicodeDecodeError):
+        matcher.search_file(str(path))
+    assert matcher.search_file(str(path), errors="ignore") == {"dcprod018a", "018a"}
+
+
+def lines_with_hits(matcher, text):
+    found = []
+    for line_number, line in enumerate(text.splitlines(keepends=True), 1):
+        patterns = matcher.search(line)
+        if patterns:
+            found.append((line_number, line, patterns))
+    return found
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 1 << 20])
+def test_hit_lines_are_the_same_for_any_block_size(size):
+    matcher = PatternMatcher(PATTERNS)
+
+    assert list(iter_hit_lines(matcher, io.BytesIO(TEXT.encode("utf-8")), size)) == lines_with_hits(matcher, TEXT)
+
+
+def test_line_blocks_end_at_line_breaks():
+    blocks = list(iter_line_blocks(io.BytesIO(b"a\nbb\nccc\n\nd"), size=3))
+
+    assert b"".join(blocks) == b"a\nbb\nccc\n\nd"
+    assert all(block.endswith(b"\n") for block in blocks[:-1])
+
+
+def test_no_patterns_find_nothing(tmp_path):
+    path = tmp_path / "server.tfvars"
+    path.write_text('hostname = "dcprod018a"\n')
+    matcher = PatternMatcher([])
+
+    assert matcher.search("x") == matcher.search_bytes(b"x") == matcher.search_file(str(path)) == set()
+    assert list(matcher.iter_matches("x")) == []
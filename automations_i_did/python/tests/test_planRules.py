@@ -0,0 +1,103 @@
+import io
+import json
+import os
+
+import pytest
+
+from tag_plan_check import (SECTION_SEPARATOR, PlanCheckCache, default_rules, print_findings, ruleset_version,
+                            run_plan_checks)
+
+VOLUME = """  # module.db[{n}].oci_core_volume.block_volume will be updated in-place
+  ~ resource "oci_core_volume" "block_volume" {{
+      ~ freeform_tags = {{
+          + "owner"         = "dba"
+          + "product_line"  = "db"
+          + "environment"   = "prod"
+          + "application"   = "oracle"
+        }}
+        id            = "ocid1.volume.oc1..{n:04d}"
+        {ninth}
+    }}
+"""
+POLICY = "  # module.db[{n}].oci_core_volume_backup_policy_assignment.volume_backup_policy_assignment[0] must be replaced\n"
+INSTANCE = "  # module.db.oci_core_instance.instance will be updated in-place\n        # (6 unchanged blocks hidden)\n"
+PLAN = "Plan: 6 to add, 7 to change, 6 to destroy.\n"
+
+
+def plan(volumes=6, policies=6, instance=INSTANCE, plan_line=PLAN, ninth_of_third="# (13 unchanged attributes hidden)"):
+    parts = [VOLUME.format(n=n, ninth=ninth_of_third if n == 2 else "# (13 unchanged attributes hidden)")
+             for n in range(volumes)]
+    return "".join(parts) + "".join(POLICY.format(n=n) for n in range(policies)) + instance + plan_line
+
+
+SAMPLES = {
+    "good.txt": plan(),
+    "no_plan_line.txt": plan(plan_line="Plan: 1 to add, 0 to change, 0 to destroy.\n"),
+    "wrong_counts.txt": plan(volumes=5, policies=4, instance=INSTANCE.replace("# (6 unchanged blocks hidden)", '~ shape = "E4"') * 2),
+    "ninth_line.txt": plan(ninth_of_third="~ size_in_gbs = 100 -> 200"),
+    "NLB_listener.txt": "  # module.nlb.oci_network_load_balancer_listener.listener will be updated in-place\n" + PLAN,
+    os.path.join("nested", "deep.txt"): plan(plan_line=""),
+}
+
+# the report of the hand-written checks the rule registry replaced, section by section
+BASELINE_REPORT = [
+    ["🚨 ~ size_in_gbs : Match found: {plans}/ninth_line.txt",
+     "⚠️ Could not read file {plans}/unreadable.txt: [Errno 2] No such file or directory: '{plans}/unreadable.txt'"],
+    ["⚠️ 9th or 7th line didn't match in BLOCK VOLUME updation - Check: {plans}/ninth_line.txt"],
+    ["📧 Found 5 matches instead of [6 or 18] for BLOCK VOLUME 'will be updated in-place' — Check: {plans}/wrong_counts.txt"],
+    ["🚨 Found 4 matches for backup policy assignment instead of [6 or 18] — Check: {plans}/wrong_counts.txt"],
+    ["🚨 Found 2 matches for INSTANCE instead of [1 or 3] 'will be updated in-place' — Check: {plans}/wrong_counts.txt"],
+    ["🚨 Mandatory TF Plan Output(6,7,6) or (18,21,18) not found in {plans}/no_plan_line.txt",
+     "Could not read file: {plans}/unreadable.txt - [Errno 2] No such file or directory: '{plans}/unreadable.txt'",
+     "🚨 Mandatory TF Plan Output(6,7,6) or (18,21,18) not found in {plans}/nested/deep.txt"],
+    ["🚨 Some VM Shape Change is about to happen — Check: {plans}/wrong_counts.txt"],
+]
+
+
+@pytest.fixture
+def plans(tmp_path):
+    folder = tmp_path / "plans"
+    (folder / "nested").mkdir(parents=True)
+    for name, text in SAMPLES.items():
+        (folder / name).write_text(text, encoding="utf-8")
+    # a dangling link: listed by the walk, but it can't be opened
+    (folder / "unreadable.txt").symlink_to(folder / "gone.txt")
+    return str(folder)
+
+
+def sections(report):
+    """The lines of every section of a text report; each section starts with two separator lines."""
+    return [section.splitlines() for section in report.split(f"{SECTION_SEPARATOR}\n{SECTION_SEPARATOR}\n")[1:]]
+
+
+def test_report_matches_the_baseline_checks(plans):
+    out = io.StringIO()
+    print_findings(run_plan_checks(plans), "text", out)
+
+    expected = [sorted(line.format(plans=plans) for line in section) for section in BASELINE_REPORT]
+    assert [sorted(section) for section in sections(out.getvalue())] == expected
+
+
+def cached_run(folder, cache_file):
+    rules = default_rules()
+    cache = PlanCheckCache(cache_file, ruleset_version(rules))
+    run_plan_checks(folder, rules, cache=cache)
+    cache.save()
+    with open(cache_file, encoding="utf-8") as f:
+        return cache, set(json.load(f)["files"])
+
+
+def test_cache_keeps_only_the_files_of_the_last_run(plans, tmp_path):
+    cache_file = str(tmp_path / "cache.json")
+    _, cached = cached_run(plans, cache_file)
+    assert os.path.join(plans, "good.txt") in cached
+
+    os.remove(os.path.join(plans, "good.txt"))
+    cache, cached = cached_run(plans, cache_file)
+    assert cache.hits and os.path.join(plans, "good.txt") not in cached
+
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "plan.txt").write_text(SAMPLES["ninth_line.txt"], encoding="utf-8")
+    _, cached = cached_run(str(other), cache_file)
+    assert cached == {str(other / "plan.txt")}
@@ -0,0 +1,96 @@
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+
+from rdsRequestScheduler import RdsRequestScheduler
+
+
+class FakeTime:
+    """A clock that only moves when told to, and a sleep that records instead of waiting."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+def rds_client(region_name="us-east-1"):
+    return boto3.client("rds", region_name=region_name, aws_access_key_id="testing", aws_secret_access_key="testing")
+
+
+def scheduler(fake_time, **kwargs):
+    return RdsRequestScheduler(sleep=fake_time.sleep, clock=fake_time.clock, **kwargs)
+
+
+def test_acquire_waits_for_the_bucket_rate():
+    fake_time = FakeTime()
+    requests = scheduler(fake_time, rates={"DescribeDBClusters": (2.0, 2)})
+
+    for _ in range(5):
+        requests.acquire("us-east-1", "DescribeDBClusters")
+    # a burst of 2, then one token every half second for the callers queued behind it
+    assert fake_time.sleeps == [0.5, 1.0, 1.5]
+
+    fake_time.now += 10
+    requests.acquire("us-east-1", "DescribeDBClusters")
+    assert fake_time.sleeps == [0.5, 1.0, 1.5]
+    # buckets are per region and API
+    requests.acquire("eu-west-1", "DescribeDBClusters")
+    requests.acquire("us-east-1", "CreateBlueGreenDeployment")
+    assert len(fake_time.sleeps) == 3
+
+
+def test_call_retries_throttling_only():
+    fake_time = FakeTime()
+    requests = scheduler(fake_time)
+    client = rds_client()
+
+    with Stubber(client) as stub:
+        stub.add_client_error("describe_db_clusters", service_error_code="Throttling", http_status_code=400)
+        stub.add_response("describe_db_clusters", {"DBClusters": []})
+        assert requests.call("us-east-1", "DescribeDBClusters", client.describe_db_clusters) == {"DBClusters": []}
+        assert len(fake_time.sleeps) == 1
+        stub.assert_no_pending_responses()
+
+        stub.add_client_error("describe_db_clusters", service_error_code="DBClusterNotFoundFault", http_status_code=404)
+        with pytest.raises(ClientError):
+            requests.call("us-east-1", "DescribeDBClusters", client.describe_db_clusters)
+        assert len(fake_time.sleeps) == 1
+
+    assert requests.metrics()["us-east-1/DescribeDBClusters"]["retries"] == 1
+
+
+def test_call_gives_up_after_max_retries():
+    fake_time = FakeTime()
+    requests = scheduler(fake_time, max_retries=2)
+    client = rds_client()
+
+    with Stubber(client) as stub:
+        for _ in range(3):
+            stub.add_client_error("describe_db_clusters", service_error_code="ThrottlingException", http_status_code=400)
+        with pytest.raises(ClientError):
+            requests.call("us-east-1", "DescribeDBClusters", client.describe_db_clusters)
+
+    assert len(fake_time.sleeps) == 2
+
+
+def test_attached_client_charges_the_bucket_of_its_region_and_api():
+    fake_time = FakeTime()
+    requests = scheduler(fake_time, rates={"DescribeBlueGreenDeployments": (1.0, 1)})
+    client = requests.attach(rds_client("eu-west-1"), "eu-west-1")
+
+    with Stubber(client) as stub:
+        stub.add_response("describe_blue_green_deployments", {"BlueGreenDeployments": []})
+        stub.add_response("describe_blue_green_deployments", {"BlueGreenDeployments": []})
+        client.describe_blue_green_deployments()
+        client.describe_blue_green_deployments()
+
+    assert {name: stats["calls"] for name, stats in requests.metrics().items()} == \
+        {"eu-west-1/DescribeBlueGreenDeployments": 2}
+    assert fake_time.sleeps == [1.0]
@@ -0,0 +1,24 @@
+import os
+import shutil
+import subprocess
+import sys
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_broken_default_registry_does_not_break_a_run_with_rules(tmp_path):
+    for name in ("tag_plan_check.py", "repoScanner.py", "instrumentation.py"):
+        shutil.copy(os.path.join(SCRIPTS, name), tmp_path)
+    (tmp_path / "plan_rules.toml").write_text("[[rule]\nname = \n")
+    shutil.copy(os.path.join(SCRIPTS, "plan_rules.toml"), tmp_path / "good_rules.toml")
+    plans = tmp_path / "plans"
+    plans.mkdir()
+    (plans / "server.plan").write_text("Plan: 0 to add, 0 to change, 0 to destroy.\n")
+
+    def run(*args):
+        return subprocess.run([sys.executable, *args], cwd=tmp_path, capture_output=True, text=True)
+
+    assert run("-c", "import tag_plan_check").returncode == 0
+    assert run("tag_plan_check.py", "-p", "plans", "-r", "good_rules.toml").returncode == 0
+    broken = run("tag_plan_check.py", "-p", "plans")
+    assert broken.returncode == 2 and "plan_rules.toml" in broken.stderr
@@ -0,0 +1,95 @@
+from findAndReplaceInTerraform import resize_mounts_in_file
+from replaceTagsInTerraform import apply_entries, build_servername_index
+
+TAGS = {"servernamexxxxx": "dcprod018ax", "owner": "new-owner", "environment": "prod"}
+
+
+def test_tags_are_set_inside_the_blocks_of_their_server_only():
+    text = ('servers = {\n'
+            '  "dcprod018a" = {\n    freeform_tags = {\n      "owner" = "old"\n    }\n  }\n'
+            '  "dcprod019a" = {\n    freeform_tags = {\n      "owner" = "other"\n    }\n  }\n'
+            '}\n')
+
+    new_text, updated = apply_entries(text, [TAGS])
+
+    assert updated
+    assert new_text == text.replace('"old"', '"new-owner"')
+
+
+def test_tags_are_set_anywhere_when_the_servername_is_only_a_value():
+    text = 'hostname = "dcprod018a"\nfreeform_tags = {\n  "owner"       = "old"\n  "environment" = "dev" # keep\n}\n'
+
+    new_text, updated = apply_entries(text, [TAGS])
+
+    assert updated
+    assert new_text == 'hostname = "dcprod018a"\nfreeform_tags = {\n  "owner"       = "new-owner"\n  "environment" = "prod" # keep\n}\n'
+
+
+def test_tags_are_set_only_in_the_object_naming_the_server_in_a_value():
+    text = ('vms = {\n'
+            '  vm1 = {\n    hostname = "dcprod018a"\n    freeform_tags = {\n      "owner" = "a"\n      "environment" = "dev"\n    }\n  }\n'
+            '  vm2 = {\n    hostname = "dcprod019a"\n    freeform_tags = {\n      "owner" = "b"\n      "environment" = "dev"\n    }\n  }\n'
+            '}\n')
+
+    new_text, updated = apply_entries(text, [TAGS])
+
+    assert updated
+    vm1, vm2 = new_text.split("vm2 = ")
+    assert '"owner" = "new-owner"' in vm1 and '"environment" = "prod"' in vm1
+    assert vm2 == text.split("vm2 = ")[1]
+
+
+def test_nothing_is_set_when_the_servername_is_neither_a_block_key_nor_a_value():
+    text = '# dcprod018a moved to another file\nfreeform_tags = {\n  "owner" = "old"\n}\n'
+
+    assert apply_entries(text, [TAGS]) == (text, False)
+
+
+def test_later_entries_win():
+    text = 'hostname = "dcprod018a"\nfreeform_tags = {\n  "owner" = "old"\n}\n'
+
+    new_text, _ = apply_entries(text, [TAGS, dict(TAGS, owner="newer")])
+
+    assert '"owner" = "newer"' in new_text
+
+
+def resize(tmp_path, text, substring, size):
+    path = tmp_path / "volumes.tfvars"
+    path.write_text(text)
+    resize_mounts_in_file(str(path), [(substring, size)])
+    return path.read_text()
+
+
+def test_resize_volume_block(tmp_path):
+    text = '"dcprod018a-u01" = {\n  size_in_gbs = 100\n}\n"dcprod018a-u02" = {\n  size_in_gbs = 100\n}\n'
+
+    assert resize(tmp_path, text, "dcprod018a-u02", "250") == \
+        '"dcprod018a-u01" = {\n  size_in_gbs = 100\n}\n"dcprod018a-u02" = {\n  size_in_gbs = 250\n}\n'
+
+
+def test_resize_volume_named_in_a_value(tmp_path):
+    text = ('volumes = [\n  {\n    display_name = "dcprod018a-u01"\n    size_in_gbs  = 100\n  },\n'
+            '  {\n    display_name = "dcprod018a-u02"\n  },\n]\nsize_in_gbs = 10\n')
+
+    assert resize(tmp_path, text, "dcprod018a-u01", "250") == text.replace("= 100", "= 250")
+    # no size in the volume's own object: nothing else is touched
+    assert resize(tmp_path, text, "dcprod018a-u02", "250") == text
+
+
+def test_resize_block_whose_key_contains_the_mount(tmp_path):
+    text = 'dcprod018a-u01-data = {\n  max_size_in_gbs = 500\n  size_in_gbs     = 100\n}\n'
+
+    assert resize(tmp_path, text, "dcprod018a-u01", "250") == text.replace("= 100", "= 250")
+
+
+def test_resize_mount_named_in_a_comment(tmp_path):
+    text = 'size_in_gbs = 10\n# dcprod018a-u01\nvolume = {\n  max_size_in_gbs = 500\n  size_in_gbs = 100\n}\n'
+
+    assert resize(tmp_path, text, "dcprod018a-u01", "250") == text.replace("= 100", "= 250")
+
+
+def test_no_servernames_index_nothing(tmp_path, caplog):
+    (tmp_path / "server.tfvars").write_text('hostname = "dcprod018a"\n')
+
+    assert build_servername_index([], str(tmp_path)) == {}
+    assert "Error reading" not in caplog.text
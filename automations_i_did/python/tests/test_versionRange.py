@@ -0,0 +1,81 @@
+import doctest
+import itertools
+
+import pytest
+
+import versionRange
+from versionRange import Version, VersionRange, eligibility_range, parse_version
+
+
+def test_doctests():
+    assert doctest.testmod(versionRange).failed == 0
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("13.12", Version((13, 12))),
+    ("13.12.1", Version((13, 12, 1))),
+    (" 14.9 ", Version((14, 9))),
+    ("15.4-limitless", Version((15, 4), "limitless")),
+    ("8.0.mysql_aurora.3.04.0", Version((8, 0), "mysql_aurora.3.04.0")),
+])
+def test_parse_version(text, expected):
+    assert parse_version(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", None, "13", "Unknown", "13.12abc", "13.12.5x", "13.12-", "v13.12", "13..12"])
+def test_parse_version_rejects(text):
+    with pytest.raises(ValueError):
+        parse_version(text)
+
+
+@pytest.mark.parametrize("expression, version, expected", [
+    (">=13.12,<15", "13.12", True),
+    (">=13.12,<15", "13.12.1", True),
+    (">=13.12,<15", "13.11.9", False),
+    (">=13.12,<15", "14.9", True),
+    (">=13.12,<15", "15.0", False),
+    (">13.12", "13.12.0", False),
+    (">13.12", "13.12.1", True),
+    ("<=14", "14.0", True),
+    ("<=14", "14.0.1", False),
+    ("==14", "14.9", True),
+    ("==14", "15.0", False),
+    ("!=14", "14.1", False),
+    ("!=14", "13.1", True),
+])
+def test_version_range_contains(expression, version, expected):
+    assert VersionRange(expression).contains(version) is expected
+
+
+@pytest.mark.parametrize("expression", ["", ">=", "13.12", "~>13", ">=13.12;<15", ">=13.x"])
+def test_version_range_rejects(expression):
+    with pytest.raises(ValueError):
+        VersionRange(expression)
+
+
+def test_evaluate_gives_none_for_unparseable_versions():
+    assert VersionRange(">=13.12,<15").evaluate(["14.9", "13.12abc", None, "14.9"]) == \
+        {"14.9": True, "13.12abc": None, None: None}
+
+
+def old_eligibility(version, min_touch_version, target_engine_version):
+    """check_engine_versions_for_bgd before version ranges: None where it reported an invalid version."""
+    min_major, min_minor = map(int, min_touch_version.split(".")[:2])
+    max_major, _ = map(int, target_engine_version.split(".")[:2])
+    try:
+        major, minor = map(int, version.split(".")[:2])
+    except (ValueError, IndexError):
+        return None
+    return (major == min_major and minor >= min_minor) or (min_major < major < max_major)
+
+
+def test_eligibility_range_matches_the_old_major_minor_check():
+    bounds = ["12.4", "13.0", "13.12", "14.9", "15.4", "16.1"]
+    versions = [f"{major}.{minor}{patch}" for major in range(11, 18) for minor in (0, 1, 4, 9, 11, 12, 13, 20)
+                for patch in ("", ".0", ".3")] + ["13", "14.x", "abc", "13.12abc"]
+    for min_touch_version, target_engine_version in itertools.product(bounds, bounds):
+        eligible = eligibility_range(min_touch_version, target_engine_version)
+        for version in versions:
+            verdict = eligible.evaluate([version])[version]
+            assert verdict == old_eligibility(version, min_touch_version, target_engine_version), \
+                (min_touch_version, target_engine_version, version)
@@ -0,0 +1,264 @@
+"""
+Single-pass tokenizer and assignment index for HCL .tfvars files, with format-preserving edits.
+
+    doc = TfvarsDocument(text)
+    for assignment in doc.find("size_in_gbs", under="dcprod018a-u01"):
+        doc.set(assignment, 250)
+    new_text = doc.render()
+
+Every assignment (key = value / key: value / key { ... }) is indexed with the keys of the
+objects around it, so edits target one assignment and only its value text is replaced:
+spacing, quoting style, commas and comments around it stay as they were.
+"""
+
+import os
+import re
+import tempfile
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import instrumentation
+
+TOKEN_PATTERN = re.compile(r"""
+    [ \t\f\r]*
+    (?:
+        (?P<newline>\n)
+      | (?P<comment>(?:\#|//)[^\n]*|/\*.*?\*/)
+      | (?P<heredoc><<-?[ \t]*(?P<marker>[A-Za-z_][A-Za-z0-9_]*)[ \t]*\r?\n(?:.*?\n)??[ \t]*(?P=marker)[ \t]*(?=\r?\n|$))
+      | (?P<string>"(?:[^"\\\n]|\\.)*")
+      | (?P<punct>[{}\[\](),=:])
+      | (?P<word>[^\s{}\[\](),=:"\#]+)
+      | (?P<other>\S)
+    )
+""", re.VERBOSE | re.DOTALL | re.MULTILINE)
+
+ESCAPE_PATTERN = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+ESCAPES = {"n": "\n", "r": "\r", "t": "\t", '"': '"', "\\": "\\"}
+
+
+@instrumentation.timed()
+def write_file_atomically(file, text):
+    """Write text to a temp file next to file and rename it over file, so readers never see a partial write."""
+    directory = os.path.dirname(os.path.abspath(file))
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, delete=False, newline='') as f:
+        f.write(text)
+        tmp_file = f.name
+    try:
+        os.chmod(tmp_file, os.stat(file).st_mode & 0o7777)
+        os.replace(tmp_file, file)
+    except Exception:
+        os.remove(tmp_file)
+        raise
+    instrumentation.file_written(file)
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    start: int
+    end: int
+    line: int
+
+
+class Assignment(NamedTuple):
+    path: Tuple[str, ...]     # keys of the enclosing objects, outermost first; list items add their index
+    key: str
+    key_span: Tuple[int, int]
+    value_span: Tuple[int, int]
+    line: int
+    is_block: bool            # value is an object
+
+
+def tokenize(text: str) -> Iterator[Token]:
+    """Yield tokens in one regex pass, whitespace dropped; stray characters come out as 'word' tokens."""
+    line = 1
+    for match in TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind is None:
+            continue  # trailing whitespace
+        start, end = match.start(kind), match.end()
+        yield Token("word" if kind == "other" else kind, text[start:end], start, end, line)
+        if kind == "newline":
+            line += 1
+        elif kind in ("comment", "heredoc"):
+            line += text.count("\n", start, end)
+
+
+def unquote(token_text: str) -> str:
+    body = token_text[1:-1]
+    if "\\" not in body:
+        return body
+    def unescape(match):
+        escape = match.group(1)
+        if escape[0] in "uU" and len(escape) > 1:
+            return chr(int(escape[1:], 16))
+        return ESCAPES.get(escape, escape)
+    return ESCAPE_PATTERN.sub(unescape, body)
+
+
+def to_hcl(value) -> str:
+    """Render a Python scalar as an HCL literal."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("${", "$${")
+    return f'"{escaped}"'
+
+
+class _Parser:
+    CLOSERS = {"{": "}", "[": "]", "(": ")"}
+
+    def __init__(self, text):
+        self.tokens = [token for token in tokenize(text) if token.kind != "comment"]
+        self.position = 0
+        self.assignments = []
+
+    def _peek(self, skip_newlines=True) -> Optional[Token]:
+        while self.position < len(self.tokens):
+            token = self.tokens[self.position]
+            if not (skip_newlines and token.kind == "newline"):
+                return token
+            self.position += 1
+        return None
+
+    def _next(self, skip_newlines=True) -> Optional[Token]:
+        token = self._peek(skip_newlines)
+        if token is not None:
+            self.position += 1
+        return token
+
+    def parse_body(self, path, closer=None):
+        """Assignments up to closer (or end of file); returns the closing token."""
+        while True:
+            token = self._next()
+            if token is None or token.text == closer:
+                return token
+            if token.kind not in ("string", "word") or token.text == ",":
+                continue
+            key = unquote(token.text) if token.kind == "string" else token.text
+            following = self._peek(skip_newlines=False)
+            if following is not None and following.text in ("=", ":"):
+                self.position += 1
+            elif following is None or following.text != "{":
+                continue  # not an assignment; skip the stray token
+            self.parse_value(path, key, token)
+
+    def parse_value(self, path, key, key_token):
+        first = self._peek()
+        if first is None or first.text in ("}", "]", ")", ","):
+            return  # missing value; leave the closer to the enclosing body
+        self.position += 1
+        is_block = first.text == "{"
+        if first.text == "{":
+            last = self.parse_body(path + (key,), "}") or first
+        elif first.text == "[":
+            last = self.parse_list(path + (key,))
+        else:
+            last = self.skip_expression(first)
+        end = last.end if last else first.end
+        self.assignments.append(Assignment(path, key, (key_token.start, key_token.end),
+                                           (first.start, end), key_token.line, is_block))
+
+    def parse_list(self, path):
+        index = 0
+        while True:
+            token = self._next()
+            if token is None or token.text == "]":
+                return token
+            if token.text == ",":
+                index += 1
+            elif token.text == "{":
+                self.parse_body(path + (str(index),), "}")
+            elif token.text == "[":
+                self.parse_list(path + (str(index),))
+
+    def skip_expression(self, first):
+        """Consume a scalar or call expression; stops before a newline, comma or closer at depth 0."""
+        last, depth = first, 0
+        if first.text in self.CLOSERS:
+            depth = 1
+        while True:
+            token = self._peek(skip_newlines=depth > 0)
+            if token is None:
+                return last
+            if depth == 0 and (token.kind == "newline" or token.text in (",", "}", "]", ")")):
+                return last
+            if token.text in self.CLOSERS:
+                depth += 1
+            elif token.text in ("}", "]", ")"):
+                depth -= 1
+            self.position += 1
+            last = token
+
+
+class TfvarsDocument:
+    """Parsed .tfvars text: an index of its assignments plus pending edits applied by render()."""
+
+    def __init__(self, text: str):
+        self.text = text
+        with instrumentation.timer("tfvars_parse"):
+            parser = _Parser(text)
+            parser.parse_body(())
+            self.assignments: List[Assignment] = sorted(parser.assignments, key=lambda a: a.key_span)
+        self.by_key: Dict[str, List[Assignment]] = {}
+        for assignment in self.assignments:
+            self.by_key.setdefault(assignment.key, []).append(assignment)
+        self._edits = {}
+
+    @classmethod
+    def load(cls, path: str, encoding: str = "utf-8") -> "TfvarsDocument":
+        with open(path, "r", encoding=encoding, newline="") as f:
+            instrumentation.file_read(f)
+            return cls(f.read())
+
+    def find(self, key: str = None, under=None) -> Iterator[Assignment]:
+        """Assignments named key (exact match) below an object whose key is under, or for which
+        under(path_key) is true when it is callable."""
+        for assignment in self.assignments if key is None else self.by_key.get(key, []):
+            if under is not None:
+                matches = under if callable(under) else under.__eq__
+                if not any(matches(path_key) for path_key in assignment.path):
+                    continue
+            yield assignment
+
+    def value_text(self, assignment: Assignment) -> str:
+        start, end = assignment.value_span
+        return self.text[start:end]
+
+    def value(self, assignment: Assignment):
+        """The value as a string when it is a quoted string, otherwise its source text."""
+        text = self.value_text(assignment)
+        return unquote(text) if text.startswith('"') and text.endswith('"') and len(text) > 1 else text
+
+    def line_text(self, assignment: Assignment) -> str:
+        start = self.text.rfind("\n", 0, assignment.key_span[0]) + 1
+        end = self.text.find("\n", assignment.key_span[0])
+        return self.text[start:end if end != -1 else len(self.text)]
+
+    def set(self, assignment: Assignment, value, raw: bool = False) -> bool:
+        """Replace the value of one assignment; value is rendered with to_hcl unless raw.
+        Returns True if the text changes."""
+        if assignment.is_block:
+            raise ValueError(f"{'.'.join(assignment.path + (assignment.key,))} is a block, not a value")
+        new_text = value if raw else to_hcl(value)
+        if new_text == self.value_text(assignment):
+            self._edits.pop(assignment.value_span, None)
+            return False
+        self._edits[assignment.value_span] = new_text
+        return True
+
+    @property
+    def changed(self) -> bool:
+        return bool(self._edits)
+
+    def render(self) -> str:
+        """The text with all edits applied, built in one pass over the sorted edit spans."""
+        parts, position = [], 0
+        for (start, end), new_text in sorted(self._edits.items()):
+            parts.append(self.text[position:start])
+            parts.append(new_text)
+            position = end
+        parts.append(self.text[position:])
+        return "".join(parts)
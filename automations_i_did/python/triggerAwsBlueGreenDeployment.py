@@ -1,47 +1,267 @@
 import json
 import argparse
 import time
+import os
 import boto3
-import csv
 import sys
+import random
+import threading
+import itertools
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple
 import logging
+import instrumentation
+from csvIngest import IngestStats, expect_columns, iter_records, log_summary
+from rdsRequestScheduler import RdsRequestScheduler
+from versionRange import eligibility_range
 
 # Configure logging
 logging.basicConfig(format="%(levelname)s: %(asctime)s %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# describe_db_clusters / describe_blue_green_deployments accept up to 100 values per filter
+DESCRIBE_FILTER_CHUNK = 100
+
+# BGD statuses that still need polling
+ACTIVE_BGD_STATUSES = ["PROVISIONING", "AVAILABLE", "SWITCHOVER_IN_PROGRESS"]
+# Poll interval per BGD status as (first, max) seconds; doubled while the status doesn't change
+POLL_INTERVALS = {
+    "PROVISIONING": (15, 60),
+    "AVAILABLE": (5, 60),
+    "SWITCHOVER_IN_PROGRESS": (10, 60),
+}
+POLL_JITTER = 0.2
+
+# Switchovers released at once per region; input rows without a priority go after prioritised ones
+MAX_SWITCHOVERS_IN_FLIGHT = 5
+DEFAULT_SWITCHOVER_PRIORITY = 100
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+class RdsClientPool:
+    """One RDS client per region, shared by every call in this script.
+
+    Clients are built from a single boto3 session, so endpoint/service models and credentials
+    are resolved once. boto3 clients are thread safe; creating them is serialised by a lock.
+    With a scheduler, every request of a client waits for its (region, API) token bucket.
+    """
+
+    def __init__(self, session=None, scheduler=None):
+        self._session = session
+        self._scheduler = scheduler
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def get(self, region_name: str):
+        with self._lock:
+            client = self._clients.get(region_name)
+            if client is None:
+                if self._session is None:
+                    self._session = boto3.session.Session()
+                client = self._session.client('rds', region_name=region_name)
+                if self._scheduler is not None:
+                    self._scheduler.attach(client, region_name)
+                self._clients[region_name] = client
+                self.created += 1
+            else:
+                self.reused += 1
+            return client
+
+    def stats(self) -> Dict[str, int]:
+        return {'created': self.created, 'reused': self.reused, 'regions': len(self._clients)}
+
+request_scheduler = RdsRequestScheduler()
+rds_client_pool = RdsClientPool(scheduler=request_scheduler)
+
+def get_rds_client(region_name: str):
+    return rds_client_pool.get(region_name)
+
+class CheckpointJournal:
+    """Append-only JSON-lines journal of deployment state changes, fsync'd after every record.
+
+    Only the fields that changed are written, so a record costs the same however many
+    deployments there are. replay() folds the records back into {cluster_id: details}.
+    Unless resume is set, a journal left by an earlier run is moved aside to path.<timestamp>
+    first, so a fresh run never replays records of finished runs.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        if not resume:
+            self.rotate(path)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def rotate(path: str):
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+        rotated = f"{path}.{time.strftime('%Y%m%dT%H%M%S')}"
+        suffix = 1
+        while os.path.exists(rotated):
+            rotated = f"{path}.{time.strftime('%Y%m%dT%H%M%S')}.{suffix}"
+            suffix += 1
+        os.replace(path, rotated)
+        logger.info(f"🗄️ Journal of the previous run moved to {rotated}")
+        return rotated
+
+    def record(self, cluster_id: str, **changes):
+        line = json.dumps({"cluster_id": cluster_id, "time": time.time(), **changes})
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def replay(path: str) -> Dict[str, Dict]:
+        deployments = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # a record torn by a crash can only be the last one
+                        logger.warning(f"⚠️ Ignoring incomplete journal record in {path}: {line.strip()}")
+                        continue
+                    entry.pop("time", None)
+                    deployments.setdefault(entry.pop("cluster_id"), {}).update(entry)
+        except FileNotFoundError:
+            logger.warning(f"⚠️ No checkpoint journal found at {path}, starting fresh")
+        return deployments
+
+class MaintenanceWindow:
+    """A UTC switchover window in the RDS PreferredMaintenanceWindow format, e.g. sun:03:00-sun:05:00.
+
+    Without weekdays (03:00-05:00) the window repeats every day. Raises ValueError on anything else.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        try:
+            start, end = text.strip().lower().split("-")
+            (self.start, start_weekly), (self.end, end_weekly) = self._minutes(start), self._minutes(end)
+        except (ValueError, IndexError):
+            raise ValueError(f"Invalid maintenance window '{text}', expected ddd:hh24:mi-ddd:hh24:mi or hh24:mi-hh24:mi")
+        if start_weekly != end_weekly:
+            raise ValueError(f"Invalid maintenance window '{text}', both ends need a weekday or neither")
+        self.period = 7 * 1440 if start_weekly else 1440
+
+    @staticmethod
+    def _minutes(part):
+        fields = part.split(":")
+        weekly = len(fields) == 3
+        day = WEEKDAYS.index(fields.pop(0)) if weekly else 0
+        hour, minute = map(int, fields)
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            raise ValueError(part)
+        return day * 1440 + hour * 60 + minute, weekly
+
+    def contains(self, when: datetime) -> bool:
+        minute = when.hour * 60 + when.minute + (when.weekday() * 1440 if self.period > 1440 else 0)
+        return (minute - self.start) % self.period < (self.end - self.start) % self.period
+
+class SwitchoverScheduler:
+    """Releases ready switchovers in waves instead of all at once.
+
+    Ready deployments are released by priority (lowest number first, then in the order they became
+    ready), at most max_in_flight per region at a time, and only inside their maintenance window if
+    they have one. A slot is freed when the deployment leaves AVAILABLE/SWITCHOVER_IN_PROGRESS.
+    """
+
+    def __init__(self, max_in_flight: int = MAX_SWITCHOVERS_IN_FLIGHT, now=lambda: datetime.now(timezone.utc)):
+        self.max_in_flight = max_in_flight
+        self.now = now
+        self.waves = 0
+        self._ready = {}      # cluster_id -> (priority, sequence, region_name, window)
+        self._in_flight = {}  # region_name -> set of cluster_ids
+        self._sequence = itertools.count()
+
+    def add(self, cluster_id: str, details: Dict):
+        """Queue a deployment whose green cluster is verified and ready to switch over."""
+        if self.is_pending(cluster_id):
+            return
+        window = details.get("maintenance_window")
+        self._ready[cluster_id] = (
+            int(details.get("priority", DEFAULT_SWITCHOVER_PRIORITY)),
+            next(self._sequence),
+            details["region_name"],
+            MaintenanceWindow(window) if window else None,
+        )
+
+    def started(self, cluster_id: str, region_name: str):
+        """Count a switchover that is already running, e.g. one resumed from the journal."""
+        self._ready.pop(cluster_id, None)
+        self._in_flight.setdefault(region_name, set()).add(cluster_id)
+
+    def finished(self, cluster_id: str, region_name: str):
+        """Free the slot of a switchover, or drop a queued one that is no longer AVAILABLE."""
+        self._ready.pop(cluster_id, None)
+        self._in_flight.get(region_name, set()).discard(cluster_id)
+
+    def is_pending(self, cluster_id: str) -> bool:
+        return cluster_id in self._ready or any(cluster_id in ids for ids in self._in_flight.values())
+
+    def release(self) -> List[str]:
+        """Cluster ids that may switch over now; they count as in flight until finished()."""
+        now = self.now()
+        released = []
+        for cluster_id, (priority, _, region_name, window) in sorted(self._ready.items(), key=lambda item: item[1][:2]):
+            in_flight = self._in_flight.setdefault(region_name, set())
+            if len(in_flight) >= self.max_in_flight or (window and not window.contains(now)):
+                continue
+            del self._ready[cluster_id]
+            in_flight.add(cluster_id)
+            released.append(cluster_id)
+        if released:
+            self.waves += 1
+            logger.info(f"🌊 Switchover wave {self.waves}: {', '.join(released)} ({len(self._ready)} still waiting)")
+        return released
+
+def parse_input_row(line: List[str]) -> Dict[str, str]:
+    # optional columns: switchover priority and maintenance window
+    expect_columns(line, 2, 4)
+    entry = {
+        'region_name': line[0].strip(),
+        'db_cluster_identifier': line[1].strip()
+    }
+    if not entry['region_name'] or not entry['db_cluster_identifier']:
+        raise ValueError("region or cluster missing")
+    if len(line) > 2 and line[2].strip():
+        try:
+            entry['priority'] = int(line[2])
+        except ValueError as e:
+            raise ValueError("invalid priority") from e
+    if len(line) > 3 and line[3].strip():
+        try:
+            entry['maintenance_window'] = MaintenanceWindow(line[3]).text.strip()
+        except ValueError as e:
+            raise ValueError("invalid maintenance window") from e
+    return entry
+
+
 def read_input_file(file_path: str) -> Tuple[List[Dict[str, str]], List[List[str]]]:
-    valid_input_entries = []
-    skipped_input_entries = []
-    
+    """The valid entries of the input CSV and the first skipped rows (the rest are only counted)."""
+    stats = IngestStats(file_path)
     try:
-        with open(file_path, mode='r', encoding='utf-8-sig') as csv_file:
-            csv_reader = csv.reader(csv_file)
-            for line in csv_reader:
-                logger.info(f"Reading line {line}")
-                if len(line) == 2:
-                    entry = {
-                        'region_name': line[0].strip(),
-                        'db_cluster_identifier': line[1].strip()
-                    }
-                    valid_input_entries.append(entry)
-                else:
-                    logger.warning(f'This line is ignored: {line}')
-                    skipped_input_entries.append(line)
-                    
-        return valid_input_entries, skipped_input_entries
-        
+        valid_input_entries = list(iter_records(file_path, parse_input_row, stats))
     except FileNotFoundError:
         logger.error(f"CSV file not found: {file_path}")
         sys.exit(1)
     except Exception as e:
         logger.error(f"Error reading CSV file: {str(e)}")
         sys.exit(1)
+    log_summary(logger, stats)
+    return valid_input_entries, [row for _, row, _ in stats.samples]
 
 def get_cluster_details(db_cluster_identifier: str, region_name: str) -> Dict[str, str]:
     try:
-        rds_client = boto3.client('rds', region_name=region_name)
+        rds_client = get_rds_client(region_name)
         response = rds_client.describe_db_clusters(
             DBClusterIdentifier=db_cluster_identifier
         )
@@ -61,63 +281,154 @@ def get_cluster_details(db_cluster_identifier: str, region_name: str) -> Dict[st
         logger.error(f"🚨Error fetching details for {db_cluster_identifier} in region {region_name}: {str(e)}")
         return {}
 
+def describe_clusters_in_region(rds_client, region_name: str, db_cluster_identifiers: List[str]) -> Dict[str, Dict[str, str]]:
+    """Fetch the details of many clusters of one region with paginated, filtered describe_db_clusters calls."""
+    found = {}
+    paginator = rds_client.get_paginator('describe_db_clusters')
+    pages = paginator.paginate(Filters=[{'Name': 'db-cluster-id', 'Values': db_cluster_identifiers}])
+    for page in pages:
+        for cluster in page.get('DBClusters', []):
+            found[cluster['DBClusterIdentifier'].lower()] = {
+                'engine_version': cluster.get('EngineVersion', 'Unknown'),
+                'db_cluster_arn': cluster.get('DBClusterArn', 'Unknown')
+            }
+    return found
+
+def discover_clusters(valid_input_entries: List[Dict[str, str]], max_workers: int = 8, get_client=get_rds_client) -> Dict[str, Dict[str, str]]:
+    """Fetch cluster details for all entries, one batched describe per region and chunk, on a bounded thread pool.
+
+    Returns the same {db_cluster_identifier: details} mapping as get_cluster_details per entry, in input order.
+    """
+    identifiers_by_region = {}
+    for entry in valid_input_entries:
+        identifiers_by_region.setdefault(entry['region_name'], []).append(entry['db_cluster_identifier'])
+
+    tasks = [
+        (region_name, identifiers[i:i + DESCRIBE_FILTER_CHUNK])
+        for region_name, identifiers in identifiers_by_region.items()
+        for i in range(0, len(identifiers), DESCRIBE_FILTER_CHUNK)
+    ]
+
+    def describe(task):
+        region_name, identifiers = task
+        try:
+            return region_name, request_scheduler.call(region_name, 'DescribeDBClusters', describe_clusters_in_region,
+                                                       get_client(region_name), region_name, identifiers)
+        except Exception as e:
+            logger.error(f"🚨Error fetching cluster details in region {region_name}: {str(e)}")
+            return region_name, {}
+
+    found_by_region = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for region_name, found in executor.map(describe, tasks):
+            found_by_region.setdefault(region_name, {}).update(found)
+
+    cluster_details = {}
+    for entry in valid_input_entries:
+        db_cluster_identifier = entry['db_cluster_identifier']
+        region_name = entry['region_name']
+        found = found_by_region.get(region_name, {}).get(db_cluster_identifier.lower())
+
+        if found:
+            cluster_details[db_cluster_identifier] = {
+                **entry,
+                **found
+            }
+            logger.info(f"Successfully processed cluster: {db_cluster_identifier}")
+        else:
+            logger.error(f"No cluster found with identifier {db_cluster_identifier} in region {region_name}")
+            logger.warning(f"Skipping cluster {db_cluster_identifier} due to errors")
+
+    return cluster_details
+
 def check_engine_versions_for_bgd(cluster_details, min_touch_version, max_dont_touch_version):
     goodforbgd = []
     badforbgd = []
 
-    # Extract major.minor from min/max versions
-    min_major, min_minor = map(int, min_touch_version.split(".")[:2])
-    max_major, max_minor = map(int, max_dont_touch_version.split(".")[:2])
+    # Compiled once per (min, target): >= min major.minor (e.g., 13.12) and below the target major (e.g., < 15)
+    eligible = eligibility_range(min_touch_version, max_dont_touch_version)
+    # one verdict per distinct engine version in the fleet
+    verdicts = eligible.evaluate(details["engine_version"] for details in cluster_details.values())
 
     for cluster_id, details in cluster_details.items():
-        try:
-            version = details["engine_version"]
-            major, minor = map(int, version.split(".")[:2])
-
-            # validate engine version to identify goodforbgd
-            if ((major == min_major and minor >= min_minor) or  # Match min limit (e.g., 13.12)
-                (major > min_major and major < max_major)):     #or    # In range (e.g., 14.x)
-                # (major == max_major and minor < max_minor)):    # Match max limit (e.g., < 15.8) just skip is major version is same as target version major
-                
-                goodforbgd.append(details)
-            else:
-                details["status"] = f"Cluster {cluster_id} with version {version} is NOT eligible for BGD (must be >= {min_touch_version} or < {max_dont_touch_version})"
-                badforbgd.append(details)
-                logger.info(f"Cluster {cluster_id} with version {version} is NOT eligible for BGD (must be >= {min_touch_version} or < {max_dont_touch_version})")
-
-        except (ValueError, IndexError) as e:
-            logger.error(f"Error parsing version for cluster {cluster_id}: {str(e)}")
+        version = details["engine_version"]
+        if verdicts[version] is None:
+            logger.error(f"Error parsing version for cluster {cluster_id}: Invalid engine version '{version}'")
             details["error"] = "Invalid engine version"
             badforbgd.append(details)
+        elif verdicts[version]:
+            goodforbgd.append(details)
+        else:
+            details["status"] = f"Cluster {cluster_id} with version {version} is NOT eligible for BGD (must be >= {min_touch_version} or < {max_dont_touch_version})"
+            badforbgd.append(details)
+            logger.info(f"Cluster {cluster_id} with version {version} is NOT eligible for BGD (must be >= {min_touch_version} or < {max_dont_touch_version})")
 
     return goodforbgd, badforbgd
 
-def trigger_blue_green_deployment(goodforbgd):
+def bgd_config(cluster, target_engine_version):
+    return {
+        "BlueGreenDeploymentName": f"{cluster['db_cluster_identifier']}-bgd",
+        "Source": cluster["db_cluster_arn"],
+        "TargetEngineVersion": target_engine_version,
+        "TargetDBParameterGroupName": "default-aurora-postgresql15",
+        "TargetDBClusterParameterGroupName": "default-aurora-postgresql15"
+    }
+
+def find_existing_bgds(goodforbgd) -> Dict[str, Dict]:
+    """BGDs that already exist for the given clusters, by BlueGreenDeploymentName, one describe per region."""
+    names_by_region = {}
+    for cluster in goodforbgd:
+        names_by_region.setdefault(cluster["region_name"], []).append(f"{cluster['db_cluster_identifier']}-bgd")
+
+    existing = {}
+    for region_name, names in names_by_region.items():
+        try:
+            bgds = request_scheduler.call(region_name, 'DescribeBlueGreenDeployments', describe_bgds_in_region,
+                                          get_rds_client(region_name), names, 'blue-green-deployment-name')
+        except Exception as e:
+            logger.error(f"❌ Error looking up existing BGDs in region {region_name}: {str(e)}")
+            continue
+        existing.update({bgd["BlueGreenDeploymentName"]: bgd for bgd in bgds.values()})
+    return existing
+
+def trigger_blue_green_deployment(goodforbgd, journal=None, resumed=None):
+    """Create a BGD per cluster. With resumed (CheckpointJournal.replay output) nothing that already
+    has a BGD, in the journal or in AWS, is created again, and in-flight deployments are carried over."""
     global target_engine_version
     deployments = {}
+    existing_bgds = find_existing_bgds(goodforbgd) if resumed is not None else {}
 
     for cluster in goodforbgd:
-        rds_client = boto3.client("rds", region_name=cluster["region_name"])
+        rds_client = get_rds_client(cluster["region_name"])
         #deployments = {cluster["db_cluster_identifier"]: cluster for cluster in goodforbgd}
         
         db_cluster_identifier = cluster["db_cluster_identifier"]
-        db_cluster_arn = cluster["db_cluster_arn"]
         bgd_deployment_name = f"{db_cluster_identifier}-bgd"
         # region_name = cluster["region_name"]
 
+        if resumed and resumed.get(db_cluster_identifier, {}).get("bgd_deployment_id"):
+            deployments[db_cluster_identifier] = {**cluster, **resumed[db_cluster_identifier]}
+            logger.info(f"♻️ Resuming Blue-Green Deployment '{deployments[db_cluster_identifier]['bgd_deployment_id']}' for cluster: {db_cluster_identifier}")
+            continue
+        if bgd_deployment_name in existing_bgds:
+            existing_bgd = existing_bgds[bgd_deployment_name]
+            deployments[db_cluster_identifier] = cluster
+            cluster["bgd_deployment_id"] = existing_bgd["BlueGreenDeploymentIdentifier"]
+            cluster["bgd_deployment_status"] = existing_bgd["Status"]
+            if journal:
+                journal.record(db_cluster_identifier, **cluster)
+            logger.info(f"♻️ Blue-Green Deployment '{cluster['bgd_deployment_id']}' already exists for cluster: {db_cluster_identifier}")
+            continue
+
         try:
             logger.info(f"🚀 Creating Blue-Green Deployment: {bgd_deployment_name} for cluster: {db_cluster_identifier}")
 
-            config = {
-                "BlueGreenDeploymentName": bgd_deployment_name,
-                "Source": db_cluster_arn,
-                "TargetEngineVersion": target_engine_version,
-                "TargetDBParameterGroupName": "default-aurora-postgresql15",
-                "TargetDBClusterParameterGroupName": "default-aurora-postgresql15"
-            }
+            config = bgd_config(cluster, target_engine_version)
             logger.info(f"📝 Blue-Green Deployment Configuration:\n{json.dumps(config, indent=4)}")
 
-            response = rds_client.create_blue_green_deployment(**config)
+            # throttled creates are retried with backoff instead of being dropped
+            response = request_scheduler.call(cluster["region_name"], 'CreateBlueGreenDeployment',
+                                              rds_client.create_blue_green_deployment, **config)
 
             # Start Blue-Green Deployment
             """
@@ -139,11 +450,22 @@ def trigger_blue_green_deployment(goodforbgd):
             deployments[db_cluster_identifier]["bgd_deployment_id"] = bgd_deployment_id
             deployments[db_cluster_identifier]["bgd_deployment_status"] = bgd_deployment_status
 
+            if journal:
+                journal.record(db_cluster_identifier, **deployments[db_cluster_identifier])
             logger.info(f"✅ Blue-Green Deployment '{bgd_deployment_id}' created successfully!")
             
         except Exception as e:
             logger.error(f"❌ Error triggering Blue-Green Deployment for {db_cluster_identifier}: {str(e)}")
             deployments[db_cluster_identifier] = {"error": str(e)}
+            if journal:
+                journal.record(db_cluster_identifier, error=str(e))
+
+    # deployments in flight when the last run stopped, e.g. mid switchover, keep being monitored
+    for db_cluster_identifier, details in (resumed or {}).items():
+        if db_cluster_identifier not in deployments and details.get("bgd_deployment_id") \
+                and details.get("bgd_deployment_status") in ACTIVE_BGD_STATUSES:
+            deployments[db_cluster_identifier] = details
+            logger.info(f"♻️ Resuming in-flight Blue-Green Deployment '{details['bgd_deployment_id']}' for cluster: {db_cluster_identifier}")
 
     return deployments
 
@@ -169,7 +491,8 @@ def get_target_member_arn(rds_client, bgd_deployment_id):
 
 def get_engine_version(rds_client, cluster_arn):
     try:
-        response = rds_client.describe_db_clusters(
+        response = request_scheduler.call(
+            rds_client.meta.region_name, 'DescribeDBClusters', rds_client.describe_db_clusters,
             DBClusterIdentifier=cluster_arn         #.split(":")[-1]
         )
         return response["DBClusters"][0]["EngineVersion"]
@@ -181,7 +504,8 @@ def get_engine_version(rds_client, cluster_arn):
 def switchover_bgd(rds_client, bgd_deployment_id):
     try:
         logger.info(f"🔄 Triggering Switchover for '{bgd_deployment_id}'...")
-        rds_client.switchover_blue_green_deployment(
+        request_scheduler.call(
+            rds_client.meta.region_name, 'SwitchoverBlueGreenDeployment', rds_client.switchover_blue_green_deployment,
             BlueGreenDeploymentIdentifier=bgd_deployment_id,
             SwitchoverTimeout=300
         )
@@ -191,85 +515,164 @@ def switchover_bgd(rds_client, bgd_deployment_id):
         logger.error(f"❌ Error triggering switchover for {bgd_deployment_id}: {str(e)}")
         return False
     
+def describe_bgds_in_region(rds_client, bgd_deployment_ids: List[str], filter_name: str = 'blue-green-deployment-identifier') -> Dict[str, Dict]:
+    """Fetch many BGDs of one region with paginated, filtered describe calls, keyed by identifier.
+
+    Each entry carries both Status and SwitchoverDetails, so no per-deployment calls are needed.
+    Pass filter_name='blue-green-deployment-name' to look BGDs up by name instead.
+    """
+    found = {}
+    paginator = rds_client.get_paginator('describe_blue_green_deployments')
+    for i in range(0, len(bgd_deployment_ids), DESCRIBE_FILTER_CHUNK):
+        chunk = bgd_deployment_ids[i:i + DESCRIBE_FILTER_CHUNK]
+        for page in paginator.paginate(Filters=[{'Name': filter_name, 'Values': chunk}]):
+            for bgd in page.get('BlueGreenDeployments', []):
+                found[bgd['BlueGreenDeploymentIdentifier']] = bgd
+    return found
+
+def next_poll_delay(status, previous_status, previous_delay):
+    """Seconds until a deployment is polled again: reset on a status change, backed off while it stays put."""
+    first, longest = POLL_INTERVALS.get(status, POLL_INTERVALS["PROVISIONING"])
+    if status != previous_status or previous_delay is None:
+        return first
+    return min(previous_delay * 2, longest)
+
+def green_is_ready(rds_client, cluster_id, details, bgd, target_engine_version) -> bool:
+    """True when the green cluster runs the target engine version; marks the deployment when it runs another one.
+
+    When the version can't be fetched the deployment is left as it is, so it is checked again on its next poll.
+    """
+    bgd_deployment_id = details["bgd_deployment_id"]
+    try:
+        cluster_arn = bgd["SwitchoverDetails"][0]["TargetMember"]
+    except (KeyError, IndexError) as e:
+        logger.error(f"❌ Error fetching TargetMember ARN for {bgd_deployment_id}: {str(e)}")
+        return False
+
+    engine_version = get_engine_version(rds_client, cluster_arn)
+    if engine_version is None:
+        return False
+    if engine_version == target_engine_version:
+        return True
+    details["bgd_deployment_status"] = "DIFFERENT ENGINE VERSION IN GREEN"
+    logger.warning(f"⚠️ {cluster_id} - Engine version is {engine_version}, expected {target_engine_version}!")
+    return False
+
 #Continuously monitors Blue-Green Deployments and triggers switchover when ready.
-def monitor_and_switchover(deployments):
-    global target_engine_version
-    while True:
-        all_completed = True
-
-        for cluster_id, details in deployments.items():
-            rds_client = boto3.client("rds", region_name=details["region_name"])
-            bgd_deployment_id = details.get("bgd_deployment_id")
-
-            if not bgd_deployment_id:
-                pass  # Skip if no deployment ID
-
-            # Fetch latest BGD status
-            bgd_status = get_bgd_status(rds_client, bgd_deployment_id)
-            deployments[cluster_id]["bgd_deployment_status"] = bgd_status
-            logger.info(f"📌 {cluster_id} - BGD Status: {bgd_status}")
-
-            # Continue loop untill SWITCHOVER_COMPLETED
-            if bgd_status in ["PROVISIONING", "AVAILABLE", "SWITCHOVER_IN_PROGRESS"]:
-                all_completed = False
-                pass
-
-            # If status is AVAILABLE, check engine version before switchover
-            if bgd_status == "AVAILABLE":
-                cluster_arn = get_target_member_arn(rds_client, bgd_deployment_id)
-
-                if cluster_arn:
-                    engine_version = get_engine_version(rds_client, cluster_arn)
-
-                    if engine_version == target_engine_version:
-                        # Trigger Switchover
-                        switchover_bgd(rds_client, bgd_deployment_id)
-                    else:
-                        deployments[cluster_id]["bgd_deployment_status"] = "DIFFERENT ENGINE VERSION IN GREEN"
-                        logger.warning(f"⚠️ {cluster_id} - Engine version is {engine_version}, expected {target_engine_version}!")
-
-        # Save updated deployments to a JSON file
-        with open("deployments.json", "w") as f:
-            json.dump(deployments, f, indent=4)
-
-        # Print latest status for visibility
-        logger.info(json.dumps(deployments, indent=4))
-
-        # If all deployments have completed, exit loop
-        if all_completed:
-            logger.info("🎉 All deployments have completed! Exiting loop.")
-            break
-
-        # Sleep for 5 minutes before checking again
-        logger.info("⏳ Sleeping for 5 minutes before next status check...")
-        time.sleep(5 * 60)
-
-def main(valid_input_entries: List[Dict[str, str]]) -> Dict[str, Dict[str, str]]:
-    # Initialize cluster_details dictionary
-    cluster_details = {}
-    
-    # Process each entry
-    for entry in valid_input_entries:
-        db_cluster_identifier = entry['db_cluster_identifier']
-        region_name = entry['region_name']
-        
-        # Get cluster details
-        details = get_cluster_details(db_cluster_identifier, region_name)
-        
-        if details:
-            cluster_details[db_cluster_identifier] = details
-            logger.info(f"Successfully processed cluster: {db_cluster_identifier}")
-        else:
-            logger.warning(f"Skipping cluster {db_cluster_identifier} due to errors")
-    
-    return cluster_details
+def monitor_and_switchover(deployments, target_engine_version, sleep=time.sleep, clock=time.monotonic, journal=None,
+                           switchovers=None):
+    """Poll all deployments until none is active, switching them over in waves once AVAILABLE
+    and their green cluster runs target_engine_version.
+
+    Each deployment has its own poll interval driven by its status (POLL_INTERVALS), backed off
+    with jitter while nothing changes. Whenever one is due, all deployments of its region are
+    refreshed with a single paginated describe. Verified deployments are queued on switchovers
+    (a SwitchoverScheduler), which decides when each one may switch. Status changes are appended
+    to journal.
+    """
+    switchovers = switchovers or SwitchoverScheduler()
+    schedule = {}  # cluster_id -> (next poll time, current delay)
+    now = clock()
+    for cluster_id, details in deployments.items():
+        if details.get("bgd_deployment_id"):
+            schedule[cluster_id] = (now, None)
+            if details.get("switchover_triggered") and details.get("bgd_deployment_status") in ACTIVE_BGD_STATUSES:
+                switchovers.started(cluster_id, details["region_name"])
+        # Skip if no deployment ID
+
+    while schedule:
+        now = clock()
+        due_regions = {deployments[c]["region_name"] for c, (next_poll, _) in schedule.items() if next_poll <= now}
+        # a region is described as a whole, so every active deployment in it is refreshed for free
+        due_by_region = {}
+        for cluster_id in schedule:
+            if deployments[cluster_id]["region_name"] in due_regions:
+                due_by_region.setdefault(deployments[cluster_id]["region_name"], []).append(cluster_id)
+
+        changed = False
+        for region_name, cluster_ids in due_by_region.items():
+            rds_client = get_rds_client(region_name)
+            try:
+                bgds = request_scheduler.call(region_name, 'DescribeBlueGreenDeployments', describe_bgds_in_region,
+                                              rds_client, [deployments[c]["bgd_deployment_id"] for c in cluster_ids])
+            except Exception as e:
+                logger.error(f"❌ Error fetching BGD status in region {region_name}: {str(e)}")
+                for cluster_id in cluster_ids:
+                    delay = next_poll_delay("ERROR", "ERROR", schedule[cluster_id][1])
+                    schedule[cluster_id] = (now + delay, delay)
+                continue
+
+            for cluster_id in cluster_ids:
+                details = deployments[cluster_id]
+                bgd = bgds.get(details["bgd_deployment_id"])
+                previous_status = details.get("bgd_deployment_status")
+                previous_triggered = details.get("switchover_triggered")
+                bgd_status = bgd["Status"] if bgd else "ERROR"
+                details["bgd_deployment_status"] = bgd_status
+                if bgd_status != previous_status:
+                    changed = True
+                    logger.info(f"📌 {cluster_id} - BGD Status: {bgd_status}")
+
+                # If status is AVAILABLE, check engine version before queueing the switchover
+                if bgd_status == "AVAILABLE" and not details.get("switchover_triggered") \
+                        and not switchovers.is_pending(cluster_id):
+                    if green_is_ready(rds_client, cluster_id, details, bgd, target_engine_version):
+                        switchovers.add(cluster_id, details)
+                    changed = True
+                elif bgd_status not in ("AVAILABLE", "SWITCHOVER_IN_PROGRESS") \
+                        and switchovers.is_pending(cluster_id):
+                    switchovers.finished(cluster_id, region_name)
+
+                if journal and (details["bgd_deployment_status"] != previous_status
+                                or details.get("switchover_triggered") != previous_triggered):
+                    journal.record(cluster_id, bgd_deployment_status=details["bgd_deployment_status"],
+                                   switchover_triggered=details.get("switchover_triggered", False))
+
+                # Continue polling untill SWITCHOVER_COMPLETED
+                if details["bgd_deployment_status"] not in ACTIVE_BGD_STATUSES:
+                    del schedule[cluster_id]
+                    continue
+
+                delay = next_poll_delay(bgd_status, previous_status, schedule[cluster_id][1])
+                schedule[cluster_id] = (now + delay * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER), delay)
+
+        for cluster_id in switchovers.release():
+            details = deployments[cluster_id]
+            details["switchover_triggered"] = switchover_bgd(get_rds_client(details["region_name"]), details["bgd_deployment_id"])
+            if not details["switchover_triggered"]:
+                # freed again; the deployment is re-queued on its next AVAILABLE poll
+                switchovers.finished(cluster_id, details["region_name"])
+            if journal:
+                journal.record(cluster_id, switchover_triggered=details["switchover_triggered"])
+            delay = POLL_INTERVALS["SWITCHOVER_IN_PROGRESS"][0]
+            schedule[cluster_id] = (clock() + delay, delay)
+            changed = True
+
+        if changed:
+            # Print latest status for visibility
+            logger.info(json.dumps(deployments, indent=4))
+
+        if schedule:
+            sleep(max(0, min(next_poll for next_poll, _ in schedule.values()) - clock()))
+
+    logger.info("🎉 All deployments have completed! Exiting loop.")
+
+def main(valid_input_entries: List[Dict[str, str]], max_workers: int = 8) -> Dict[str, Dict[str, str]]:
+    # Discover all clusters concurrently, batched per region
+    return discover_clusters(valid_input_entries, max_workers=max_workers)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Create Blue Green Deployment for Aurora RDS cluster')
-    parser.add_argument('--file', '-f', required=True, help='Path to the input CSV file with cluster,region')
+    parser.add_argument('--file', '-f', required=True, help='Path to the input CSV file with region,cluster[,priority[,maintenance window]]')
     parser.add_argument('--engine_version', '-e', required=True, help='Target engine version for BGD')
     parser.add_argument('--min_touch_version', '-m', required=True, help='Minimum version for which you need to trigger BGD')
+    parser.add_argument('--max_workers', '-w', type=int, default=8, help='Number of concurrent cluster discovery calls')
+    parser.add_argument('--journal', '-j', default='deployments.jsonl', help='Checkpoint journal of deployment state changes')
+    parser.add_argument('--resume', '-r', action='store_true', help='Resume from the checkpoint journal instead of starting fresh')
+    parser.add_argument('--max_in_flight', '-s', type=int, default=MAX_SWITCHOVERS_IN_FLIGHT, help='Max switchovers running at once per region')
+    instrumentation.add_arguments(parser)
     args = parser.parse_args()
+    instrumentation.configure(args)
     
     #Assign variable from input arguments
     target_engine_version = args.engine_version
@@ -278,11 +681,13 @@ if __name__ == "__main__":
 
     # Read and validate input CSV entries - skip or pass
     valid_input_entries, skipped_input_entries = read_input_file(args.file)
-    logger.info(f"✅Final Valid Input Entries:\n{json.dumps(valid_input_entries, indent=4)}")
-    logger.info(f"⚠️ Final Skipped Input Entries: \n{json.dumps(skipped_input_entries, indent=4)}")
+    # read_input_file logged the counts and the sampled skipped rows; the full dump is only for debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"✅Final Valid Input Entries:\n{json.dumps(valid_input_entries, indent=4)}")
+        logger.debug(f"⚠️ Final Skipped Input Entries: \n{json.dumps(skipped_input_entries, indent=4)}")
 
     # Extract all related cluster details of the valid inputs to proceed further
-    cluster_details = main(valid_input_entries)
+    cluster_details = main(valid_input_entries, args.max_workers)
     logger.info(f"🔥Final Valid Input Cluster Details:\n{json.dumps(cluster_details, indent=4)}")
 
     #validate engine version to determine if its good for bgd or not
@@ -290,14 +695,21 @@ if __name__ == "__main__":
     logger.info(f"✅ Good for BGD Deployment:\n{json.dumps(goodforbgd, indent=4)}")
     logger.warning(f"⛔️ Bad for BGD Deployment:\n{json.dumps(badforbgd, indent=4)}")
 
+    #rebuild in-flight deployments from the journal when resuming
+    resumed = CheckpointJournal.replay(args.journal) if args.resume else None
+    journal = CheckpointJournal(args.journal, resume=args.resume)
+
     #trigger bgd using goodforbgd list
-    deployments = trigger_blue_green_deployment(goodforbgd)
+    deployments = trigger_blue_green_deployment(goodforbgd, journal, resumed)
     logger.info(f"🔥 Triggered Blue-Green Deployment Status:\n{json.dumps(deployments, indent=4)}")
 
-    #sleep for 30 minutes to get the deployment status
-    logger.info("⏳ Sleeping for 30 minutes to allow deployments to stabilize...")
-    time.sleep(30 * 60)
-    logger.info("✅ Resuming execution after 30 minutes of sleep.")
+    #poll the deployments; each one is switched over as soon as it is AVAILABLE
+    logger.info("⏳ Polling Blue-Green Deployments until they are ready for switchover...")
 
     #for bgdstatus in bgd_deployment_status is AVAILABLE, then validate and proceed with network switching
-    monitor_and_switchover (deployments)
\ No newline at end of file
+    monitor_and_switchover (deployments, target_engine_version, journal=journal, switchovers=SwitchoverScheduler(args.max_in_flight))
+    journal.close()
+
+    client_stats = rds_client_pool.stats()
+    logger.info(f"🔌 RDS clients: {client_stats['created']} created, {client_stats['reused']} reused across {client_stats['regions']} regions")
+    logger.info(f"🚦 RDS requests: {request_scheduler.summary()}")
\ No newline at end of file
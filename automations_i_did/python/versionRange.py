@@ -0,0 +1,98 @@
+"""
+Aurora engine version parsing and compiled version-range constraints.
+
+Versions are a dotted numeric release followed by an optional suffix, as RDS reports them:
+13.12, 13.12.1, 15.4-limitless, 8.0.mysql_aurora.3.04.0. Ranges are comma-separated clauses
+that must all hold, e.g. ">=13.12,<15". Releases are compared padded with zeros, so 13.12.1
+is >=13.12 and 14.9 is <15; ==14 / !=14 compare only the components given (14.x).
+
+    >>> VersionRange(">=13.12,<15").evaluate(["13.11", "13.12.1", "14.9", "15.4", "Unknown"])
+    {'13.11': False, '13.12.1': True, '14.9': True, '15.4': False, 'Unknown': None}
+"""
+
+import re
+import operator
+from functools import lru_cache
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+# a suffix needs a separator and can't start with a digit, so 13.12abc or 13.12.5x are rejected
+VERSION_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)*)(?:[.\-_+]([^\d\s].*?))?\s*$")
+CLAUSE_PATTERN = re.compile(r"^\s*(>=|<=|==|!=|>|<)\s*(\d+(?:\.\d+)*)\s*$")
+
+_COMPARISONS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+
+class Version(NamedTuple):
+    release: Tuple[int, ...]
+    suffix: str = ""
+
+
+@lru_cache(maxsize=None)
+def parse_version(text: str) -> Version:
+    """Parse an engine version; it needs at least major.minor. Raises ValueError otherwise."""
+    match = VERSION_PATTERN.match(text or "")
+    release = tuple(map(int, match.group(1).split("."))) if match else ()
+    if len(release) < 2:
+        raise ValueError(f"Invalid engine version '{text}'")
+    return Version(release, match.group(2) or "")
+
+
+def _pad(release: Tuple[int, ...], width: int) -> Tuple[int, ...]:
+    return release + (0,) * (width - len(release))
+
+
+class VersionRange:
+    """A compiled constraint expression. contains() checks one version, evaluate() a whole fleet."""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.clauses = []
+        for clause in expression.split(","):
+            match = CLAUSE_PATTERN.match(clause)
+            if not match:
+                raise ValueError(f"Invalid version constraint '{clause.strip()}' in '{expression}'")
+            self.clauses.append((match.group(1), tuple(map(int, match.group(2).split(".")))))
+
+    def __repr__(self):
+        return f"VersionRange('{self.expression}')"
+
+    def contains(self, version) -> bool:
+        release = (version if isinstance(version, Version) else parse_version(version)).release
+        for op, bound in self.clauses:
+            if op in _COMPARISONS:
+                width = max(len(release), len(bound))
+                if not _COMPARISONS[op](_pad(release, width), _pad(bound, width)):
+                    return False
+            elif (release[:len(bound)] == bound) != (op == "=="):
+                return False
+        return True
+
+    def evaluate(self, versions: Iterable[str]) -> Dict[str, Optional[bool]]:
+        """Verdict per distinct version, None for one that doesn't parse; each is checked only once."""
+        verdicts = {}
+        for version in versions:
+            if version not in verdicts:
+                try:
+                    verdicts[version] = self.contains(version)
+                except (ValueError, TypeError):
+                    verdicts[version] = None
+        return verdicts
+
+
+@lru_cache(maxsize=None)
+def compile_range(expression: str) -> VersionRange:
+    return VersionRange(expression)
+
+
+@lru_cache(maxsize=None)
+def eligibility_range(min_touch_version: str, target_engine_version: str) -> VersionRange:
+    """Clusters worth a BGD: at least min major.minor and below the target major, but always
+    covering the whole min major (min 13.12 / target 15.4 -> >=13.12,<15)."""
+    min_major, min_minor = parse_version(min_touch_version).release[:2]
+    max_major = parse_version(target_engine_version).release[0]
+    return compile_range(f">={min_major}.{min_minor},<{max(max_major, min_major + 1)}")